@@ -0,0 +1,87 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from recipes.counters import COUNTERS
+from recipes.models import User
+
+# Поля пользователя в снимке. Хэш пароля в общий кэш не попадает, а
+# счётчики (recipes_count, followers_count) и флаг is_celebrity меняются
+# UPDATE без сигналов и в снимке бы устарели; все они догружаются из БД
+# при обращении.
+SKIPPED_FIELDS = {'password', 'is_celebrity'} | {
+    field for model, field, *_ in COUNTERS if model is User}
+USER_FIELDS = tuple(
+    field for field in User._meta.concrete_fields
+    if field.attname not in SKIPPED_FIELDS
+)
+
+
+def _key(token_key):
+    # В ключе кэша хэш, а не сам токен.
+    digest = hashlib.sha256(token_key.encode()).hexdigest()
+    return f'auth_token:{digest}'
+
+
+def _snapshot(token):
+    user = token.user
+    return (
+        user._state.db,
+        [field.get_prep_value(field.value_from_object(user))
+         for field in USER_FIELDS],
+        token.created,
+    )
+
+
+def _restore(token_key, snapshot):
+    db, values, created = snapshot
+    user = User.from_db(
+        db, [field.attname for field in USER_FIELDS], values)
+    token = Token.from_db(
+        db, ['key', 'user_id', 'created'], [token_key, user.pk, created])
+    token.user = user
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication со снимком пользователя в общем кэше.
+
+    Без кэша каждый запрос начинается с JOIN токена и пользователя;
+    здесь запрос к БД нужен только при промахе. Снимок удаляется при
+    выходе, смене пароля и любом сохранении пользователя (сигналы в
+    api.signals), а AUTH_TOKEN_CACHE_TIMEOUT ограничивает изменения
+    в обход ORM.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = cache.get(_key(key))
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                _key(key), _snapshot(token),
+                settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            return user, token
+        user, token = _restore(key, snapshot)
+        if not user.is_active:
+            return super().authenticate_credentials(key)
+        return user, token
+
+
+def invalidate_tokens(*token_keys):
+    """Удаляет снимки сразу и ещё раз после фиксации транзакции."""
+    keys = [_key(token_key) for token_key in token_keys]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # Параллельный запрос мог успеть положить в кэш старый снимок.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(*Token.objects.filter(
+        user_id=user_id).values_list('key', flat=True))
@@ -0,0 +1,163 @@
+import csv
+import io
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from .renderers import FastJSONRenderer
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:  # pragma: no cover - PDF-выгрузка необязательна
+    canvas = None
+
+
+class Echo:
+    """Файлоподобный объект, который возвращает записанное вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    """
+    Основа рендереров списка покупок.
+
+    stream() превращает итератор позиций
+    {'name', 'measurement_unit', 'amount'} в итератор байтов для
+    StreamingHttpResponse; render() нужен DRF для обычных ответов
+    (например, ошибок) и выводит их текстом.
+    """
+    filename = 'shopping_list'
+    charset = 'utf-8'
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    def get_content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data or '').encode(self.charset or 'utf-8')
+
+    def stream(self, items):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListExporter, BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        yield 'Список покупок:\n====================\n'.encode()
+        for item in items:
+            yield (
+                f'• {item["name"]} — {item["amount"]} '
+                f'{item["measurement_unit"]}\n'
+            ).encode()
+
+
+class ShoppingListCSVRenderer(ShoppingListExporter, BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единица измерения')).encode()
+        for item in items:
+            yield writer.writerow((
+                item['name'], item['amount'], item['measurement_unit'],
+            )).encode()
+
+
+class ShoppingListJSONRenderer(ShoppingListExporter, FastJSONRenderer):
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return FastJSONRenderer.render(
+            self, data, accepted_media_type, renderer_context)
+
+    def stream(self, items):
+        separator = b'['
+        for item in items:
+            yield separator + FastJSONRenderer.render(self, item)
+            separator = b','
+        yield b'[]' if separator == b'[' else b']'
+
+
+class ShoppingListPDFRenderer(ShoppingListExporter, BaseRenderer):
+    """
+    Список покупок для печати.
+
+    reportlab пишет документ только целиком при save(), поэтому PDF
+    собирается в буфере и уже затем отдаётся блоками: курсор БД всё
+    равно читается порциями, но первые байты уходят клиенту в конце.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    block_size = 64 * 1024
+
+    @classmethod
+    def is_available(cls):
+        return canvas is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return b''.join(self.stream([], title=' '.join(
+                str(value) for value in data.values())))
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def register_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT))
+
+    def stream(self, items, title='Список покупок'):
+        self.register_font()
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        height = A4[1]
+        line_height = self.font_size * 1.5
+        pdf.setFont(self.font_name, self.font_size + 4)
+        pdf.drawString(self.margin, height - self.margin, title)
+        y = height - self.margin - line_height * 2
+        pdf.setFont(self.font_name, self.font_size)
+        for item in items:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y,
+                f'• {item["name"]} — {item["amount"]} '
+                f'{item["measurement_unit"]}',
+            )
+            y -= line_height
+        pdf.save()
+        buffer.seek(0)
+        while block := buffer.read(self.block_size):
+            yield block
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer,
+)
@@ -1,9 +1,46 @@
-import django_filters
-
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 from django_filters.widgets import BooleanWidget
 
-from recipes.models import Recipe
+from .versions import TAGS, get_versions
+from recipes.models import Recipe, Tag
+
+
+def get_tag_ids_by_slug():
+    """Словарь {slug: id} всех тегов, кэшируемый до изменения тегов."""
+    version, = get_versions(TAGS)
+    key = f'tag_ids_by_slug:{version}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids)
+    return tag_ids
+
+
+class TagSlugFilter(filters.MultipleChoiceFilter):
+    """
+    Фильтр рецептов по любому из переданных slug тегов.
+
+    Варианты берутся из кэша, а фильтрация идёт через EXISTS по таблице
+    связи рецептов и тегов: без JOIN рецепты не дублируются и DISTINCT
+    не нужен, сколько бы тегов ни было выбрано.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', lambda: [
+            (slug, slug) for slug in get_tag_ids_by_slug()])
+        kwargs.setdefault('distinct', False)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = get_tag_ids_by_slug()
+        return qs.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value],
+        )))
 
 
 class TransformativeBooleanFilter(filters.BooleanFilter):
@@ -26,7 +63,7 @@ class TransformativeBooleanFilter(filters.BooleanFilter):
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = django_filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagSlugFilter(field_name='tags__slug')
     is_favorited = TransformativeBooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = TransformativeBooleanFilter(
         method='filter_is_in_shopping_cart')
@@ -47,9 +84,9 @@ class RecipeFilter(filters.FilterSet):
         return queryset.exclude(**filter_kwargs)
 
     def filter_is_favorited(self, queryset, name, value):
-        return self._boolean_filter(self, queryset, name, value,
+        return self._boolean_filter(queryset, name, value,
                                     filter_field='favorited_by__user')
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        return self._boolean_filter(self, queryset, name, value,
+        return self._boolean_filter(queryset, name, value,
                                     filter_field='shopping_cart__user')
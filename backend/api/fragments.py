@@ -0,0 +1,49 @@
+from django.conf import settings
+
+from .lru import LRUCache
+from .versions import INGREDIENTS, TAGS, USERS, get_versions
+
+# Общая для всех пользователей часть представления рецепта.
+# Запись хранится по id рецепта вместе с версией содержимого; устаревшая
+# версия считается промахом, поэтому другие процессы gunicorn не отдадут
+# старые данные после изменения рецепта. В версию входят и версии тегов,
+# ингредиентов и пользователей: фрагмент содержит их названия и имя
+# автора, а правка любого из них (в том числе в админке) меняет версию.
+recipe_fragments = LRUCache(
+    maxsize=settings.RECIPE_FRAGMENT_CACHE_SIZE,
+    timeout=settings.RECIPE_FRAGMENT_CACHE_TIMEOUT,
+)
+
+
+def _related_versions(context):
+    # Версии читаются из общего кэша один раз на ответ, а не на рецепт.
+    if 'fragment_versions' not in context:
+        context['fragment_versions'] = tuple(
+            get_versions(TAGS, INGREDIENTS, USERS))
+    return context['fragment_versions']
+
+
+def _version(recipe, context):
+    # Абсолютный URL изображения зависит от хоста запроса.
+    request = context.get('request')
+    host = request.build_absolute_uri('/') if request else ''
+    return recipe.updated_at, host, _related_versions(context)
+
+
+def get_fragment(recipe, context):
+    """Возвращает сохранённое представление рецепта актуальной версии."""
+    entry = recipe_fragments.get(recipe.id)
+    if entry is None:
+        return None
+    version, fragment = entry
+    if version != _version(recipe, context):
+        return None
+    return fragment
+
+
+def set_fragment(recipe, context, fragment):
+    recipe_fragments.set(recipe.id, (_version(recipe, context), fragment))
+
+
+def invalidate_fragment(recipe_id):
+    recipe_fragments.delete(recipe_id)
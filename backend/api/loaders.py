@@ -0,0 +1,89 @@
+from abc import ABC, abstractmethod
+
+from .membership_sets import contains, get_membership_sets
+
+
+class BatchLoader(ABC):
+    """
+    Пакетный загрузчик связей в духе DataLoader.
+
+    Ключи всей страницы регистрируются через prime(), а первый же вызов
+    load() отвечает на все накопленные ключи одним запросом. Загрузчик
+    хранится в контексте сериализатора, поэтому кэш общий для всей страницы.
+    """
+    default = None
+
+    def __init__(self, request):
+        self.request = request
+        self._pending = set()
+        self._cache = {}
+
+    def prime(self, keys):
+        """Регистрирует ключи, которые понадобятся позже."""
+        self._pending.update(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        """Возвращает значение для ключа, при необходимости догружая пакет."""
+        if key not in self._cache:
+            self._pending.add(key)
+            self._dispatch()
+        return self._cache[key]
+
+    def _dispatch(self):
+        keys, self._pending = self._pending, set()
+        result = self.batch_load(keys)
+        for key in keys:
+            self._cache[key] = result.get(key, self.default)
+
+    @abstractmethod
+    def batch_load(self, keys):
+        """Возвращает словарь {ключ: значение} для переданных ключей."""
+
+
+class MembershipLoader(BatchLoader):
+    """
+    Проверяет, связан ли текущий пользователь с объектами по ключам.
+
+    Запросов к БД нет: id связей берутся из кэша get_membership_sets,
+    общего для всех загрузчиков запроса, поэтому SQL списка рецептов
+    одинаков для всех пользователей.
+    """
+    default = False
+    set_name = None
+
+    def batch_load(self, keys):
+        user = self.request.user
+        if user.is_anonymous or not keys:
+            return {}
+        ids = getattr(get_request_membership_sets(self.request),
+                      self.set_name)
+        return {key: True for key in keys if contains(ids, key)}
+
+
+class SubscribedLoader(MembershipLoader):
+    set_name = 'following'
+
+
+class FavoritedLoader(MembershipLoader):
+    set_name = 'favorites'
+
+
+class InShoppingCartLoader(MembershipLoader):
+    set_name = 'shopping_cart'
+
+
+def get_request_membership_sets(request):
+    """Связи пользователя, прочитанные из кэша один раз за запрос."""
+    sets = getattr(request, '_membership_sets', None)
+    if sets is None:
+        sets = get_membership_sets(request.user.id)
+        request._membership_sets = sets
+    return sets
+
+
+def get_loader(context, loader_class):
+    """Возвращает загрузчик из контекста, создавая его при первом вызове."""
+    loaders = context.setdefault('loaders', {})
+    if loader_class not in loaders:
+        loaders[loader_class] = loader_class(context.get('request'))
+    return loaders[loader_class]
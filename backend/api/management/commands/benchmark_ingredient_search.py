@@ -0,0 +1,129 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.search import PrefixIndex
+
+WORDS = (
+    'молоко', 'творог', 'сыр', 'масло', 'мука', 'сахар', 'соль', 'перец',
+    'помидоры', 'огурцы', 'картофель', 'морковь', 'лук', 'чеснок', 'капуста',
+    'говядина', 'свинина', 'курица', 'индейка', 'баранина', 'лосось',
+    'треска', 'креветки', 'рис', 'гречка', 'овсянка', 'фасоль', 'горох',
+    'яблоки', 'груши', 'вишня', 'клубника', 'малина', 'смородина', 'изюм',
+    'орехи', 'миндаль', 'фундук', 'мёд', 'шоколад', 'какао', 'кофе', 'чай',
+    'уксус', 'горчица', 'майонез', 'кетчуп', 'сметана', 'кефир', 'йогурт',
+    'сливки', 'яйца', 'хлеб', 'лаваш', 'тесто', 'грибы', 'шампиньоны',
+    'петрушка', 'укроп', 'базилик', 'тимьян', 'розмарин', 'корица', 'ваниль',
+)
+QUALIFIERS = (
+    'свежие', 'сушёные', 'копчёные', 'жареные', 'варёные', 'маринованные',
+    'домашние', 'фермерские', 'органические', 'замороженные', 'молотые',
+    'цельные', 'рубленые', 'тёртые', 'консервированные', 'солёные',
+    'острые', 'сладкие', 'красные', 'зелёные', 'белые', 'чёрные',
+)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+class Command(BaseCommand):
+    help = ('Замер поиска ингредиентов (префикс, подстрока, триграммы) '
+            'на синтетическом каталоге, без обращения к БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=50000,
+            help='Размер синтетического каталога (по умолчанию: 50000)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=2000,
+            help='Количество запросов каждого вида (по умолчанию: 2000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Зерно генератора случайных чисел (по умолчанию: 1)'
+        )
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(kwargs['seed'])
+        catalog = self._catalog(rng, kwargs['size'])
+
+        started = time.perf_counter()
+        index = PrefixIndex(catalog, key=lambda item: item['name'])
+        self.stdout.write(
+            f'Каталог: {len(index)} ингредиентов, индекс построен за '
+            f'{(time.perf_counter() - started) * 1000:.0f} мс')
+        started = time.perf_counter()
+        index.trigrams
+        self.stdout.write(
+            f'Индекс триграмм построен за '
+            f'{(time.perf_counter() - started) * 1000:.0f} мс')
+
+        names = [item['name'] for item in catalog]
+        prefixes = [
+            rng.choice(names)[:rng.randint(2, 8)]
+            for _ in range(kwargs['queries'])
+        ]
+        typos = [
+            self._typo(rng, rng.choice(names).split()[0])
+            for _ in range(kwargs['queries'])
+        ]
+        phrases = [
+            ' '.join(self._typo(rng, word) for word in name.split()[:2])
+            for name in rng.sample(names, kwargs['queries'])
+        ]
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        for title, queries, fuzzy in (
+            ('Префикс', prefixes, False),
+            ('Слово с опечаткой', typos, True),
+            ('Фраза с опечатками', phrases, True),
+        ):
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                index.search(query, limit, fuzzy)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f'{title}: медиана {statistics.median(timings):.3f} мс, '
+                f'p99 {p99:.3f} мс, максимум {timings[-1]:.3f} мс')
+
+    @staticmethod
+    def _catalog(rng, size):
+        names = set()
+        while len(names) < size:
+            words = [rng.choice(WORDS)]
+            if rng.random() < 0.7:
+                words.append(rng.choice(QUALIFIERS))
+            if rng.random() < 0.3:
+                words.append(rng.choice(WORDS))
+            if rng.random() < 0.5:
+                words.append(f'{rng.randint(1, 99)}%')
+            names.add(' '.join(words))
+        return [
+            {'id': number, 'name': name, 'measurement_unit': rng.choice(UNITS)}
+            for number, name in enumerate(sorted(names), start=1)
+        ]
+
+    @staticmethod
+    def _typo(rng, word):
+        """Одна опечатка: замена, пропуск или перестановка букв."""
+        if len(word) < 4:
+            return word
+        position = rng.randrange(1, len(word) - 1)
+        kind = rng.randrange(3)
+        if kind == 0:
+            return word[:position] + rng.choice(LETTERS) + word[position + 1:]
+        if kind == 1:
+            return word[:position] + word[position + 1:]
+        return (word[:position] + word[position + 1] + word[position]
+                + word[position + 2:])
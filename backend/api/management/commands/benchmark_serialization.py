@@ -0,0 +1,102 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fragments import recipe_fragments
+from api.renderers import FastJSONRenderer
+from api.serializers import (
+    FieldPlanMixin,
+    IngredientSerializer,
+    RecipeListSerializer,
+)
+
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнение стандартной сериализации DRF с планом полей и '
+            'orjson на странице рецептов и полном списке ингредиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100,
+            help='Количество рецептов на странице (по умолчанию: 100)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Количество повторов каждого замера (по умолчанию: 20)'
+        )
+
+    def handle(self, *args, **kwargs):
+        iterations = kwargs['iterations']
+        recipes = list(
+            Recipe.objects.prefetch_related(
+                *RecipeListSerializer.prefetch_fields.values()
+            )[:kwargs['recipes']]
+        )
+        ingredients = list(Ingredient.objects.all())
+        if not recipes or not ingredients:
+            self.stdout.write(self.style.WARNING(
+                'В базе нет рецептов или ингредиентов, '
+                'сначала заполните её (generate_dataset, import_ingredients).'
+            ))
+            return
+
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', HTTP_HOST=settings.ALLOWED_HOSTS[0].strip()))
+        request.user = AnonymousUser()
+        cases = (
+            ('DRF + JSONRenderer', False, JSONRenderer()),
+            ('План полей + FastJSONRenderer', True, FastJSONRenderer()),
+        )
+        payloads = (
+            (f'Страница из {len(recipes)} рецептов',
+             RecipeListSerializer, recipes),
+            (f'Все ингредиенты ({len(ingredients)})',
+             IngredientSerializer, ingredients),
+        )
+        try:
+            for title, serializer_class, instances in payloads:
+                self.stdout.write(title)
+                results = {}
+                for label, use_field_plan, renderer in cases:
+                    FieldPlanMixin.use_field_plan = use_field_plan
+                    results[label] = self._measure(
+                        serializer_class, instances, request, renderer,
+                        iterations,
+                    )
+                    median, p95 = results[label]
+                    self.stdout.write(
+                        f'  {label}: медиана {median:.2f} мс, '
+                        f'p95 {p95:.2f} мс'
+                    )
+                baseline, fast = (results[label][0] for label, *_ in cases)
+                self.stdout.write(self.style.SUCCESS(
+                    f'  Ускорение: x{baseline / fast:.1f}'))
+        finally:
+            FieldPlanMixin.use_field_plan = True
+
+    @staticmethod
+    def _measure(serializer_class, instances, request, renderer, iterations):
+        timings = []
+        for _ in range(iterations):
+            # Замеряем полную сериализацию, без кэша фрагментов.
+            recipe_fragments.clear()
+            started = time.perf_counter()
+            data = serializer_class(
+                instances, many=True, context={'request': request}).data
+            renderer.render(data)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return statistics.median(timings), p95
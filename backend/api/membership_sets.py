@@ -0,0 +1,67 @@
+from array import array
+from bisect import bisect_left
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import IntegerField, Value
+
+from .versions import MEMBERSHIPS, get_versions, membership_version
+from recipes.models import Favorite, Follow, ShoppingCart
+
+FAVORITES = 0
+SHOPPING_CART = 1
+FOLLOWING = 2
+
+
+class MembershipSets(NamedTuple):
+    """Отсортированные id избранного, корзины и авторов из подписок."""
+    favorites: array
+    shopping_cart: array
+    following: array
+
+
+def contains(ids, value):
+    """Проверяет наличие value в отсортированном массиве двоичным поиском."""
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _kind(queryset, field, kind):
+    return queryset.annotate(
+        kind=Value(kind, output_field=IntegerField())
+    ).values_list(field, 'kind').order_by()
+
+
+def load_membership_sets(user_id):
+    """Читает id всех трёх связей пользователя одним UNION ALL."""
+    rows = _kind(
+        Favorite.objects.filter(user_id=user_id), 'recipe_id', FAVORITES,
+    ).union(
+        _kind(ShoppingCart.objects.filter(user_id=user_id),
+              'recipe_id', SHOPPING_CART),
+        _kind(Follow.objects.filter(user_id=user_id),
+              'author_id', FOLLOWING),
+        all=True,
+    )
+    ids = ([], [], [])
+    for object_id, kind in rows:
+        ids[kind].append(object_id)
+    return MembershipSets(*(array('q', sorted(values)) for values in ids))
+
+
+def get_membership_sets(user_id):
+    """
+    Возвращает связи пользователя из общего кэша.
+
+    Ключ содержит версию связей пользователя и общую версию связей,
+    поэтому любая запись через API делает старую запись недостижимой.
+    Массивы int64 занимают 8 байт на id и сериализуются одним блоком.
+    """
+    common, own = get_versions(MEMBERSHIPS, membership_version(user_id))
+    key = f'membership_sets:{user_id}:{common}:{own}'
+    sets = cache.get(key)
+    if sets is None:
+        sets = load_membership_sets(user_id)
+        cache.set(key, sets, settings.MEMBERSHIP_SETS_CACHE_TIMEOUT)
+    return sets
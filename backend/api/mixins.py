@@ -0,0 +1,110 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .versions import MEMBERSHIPS, get_versions, membership_version
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list/retrieve по версиям ресурсов.
+
+    Валидаторы строятся из версий в кэше, поэтому If-None-Match и
+    If-Modified-Since обрабатываются до обращения к queryset.
+    """
+    version_names = ()
+    per_user_versions = False
+
+    def get_version_names(self, request):
+        names = list(self.version_names)
+        if self.per_user_versions and request.user.is_authenticated:
+            names += [MEMBERSHIPS, membership_version(request.user.id)]
+        return names
+
+    def get_validators(self, request):
+        versions = get_versions(*self.get_version_names(request))
+        digest = hashlib.sha1(repr((
+            versions,
+            request.user.id,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        )).encode()).hexdigest()
+        return f'"{digest}"', max(versions) // 10 ** 9
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(
+            super().retrieve, request, *args, **kwargs)
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэш готовых JSON-ответов list/retrieve для анонимных пользователей.
+
+    Ответ анонимному пользователю зависит только от параметров запроса,
+    поэтому ключ строится из нормализованных параметров response_cache_params
+    и версий ресурсов version_names: любая запись, меняющая версию,
+    делает старые ключи недостижимыми.
+    """
+    version_names = ()
+    response_cache_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        params = [
+            (name, sorted(request.query_params.getlist(name)))
+            for name in sorted(self.response_cache_params)
+            if name in request.query_params
+        ]
+        digest = hashlib.sha1(repr((
+            get_versions(*self.version_names),
+            self.action,
+            sorted(self.kwargs.items()),
+            params,
+            request.build_absolute_uri('/'),
+        )).encode()).hexdigest()
+        return f'response:{self.basename}:{digest}'
+
+    def _cached(self, handler, request, *args, **kwargs):
+        if (not request.user.is_anonymous
+                or request.accepted_renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        content = cache.get(key)
+        if content is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context(),
+            )
+            cache.set(
+                key, content, settings.ANONYMOUS_RESPONSE_CACHE_TIMEOUT)
+        return HttpResponse(
+            content, content_type=request.accepted_media_type)
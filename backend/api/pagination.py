@@ -0,0 +1,182 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация по составному ключу сортировки.
+
+    Следующая страница выбирается условием «строго после последней строки»
+    вместо OFFSET, поэтому глубина страницы не влияет на время ответа,
+    а COUNT(*) не выполняется вовсе.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        page = list(queryset[:self.limit + 1])
+        has_more = len(page) > self.limit
+        page = page[:self.limit]
+        if reverse:
+            page.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        self.next_cursor = (
+            self.encode_cursor(page[-1], reverse=False)
+            if has_next and page else None
+        )
+        self.previous_cursor = (
+            self.encode_cursor(page[0], reverse=True)
+            if has_previous and page else None
+        )
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._get_link(self.next_cursor),
+            'previous': self._get_link(self.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {
+                    'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def decode_cursor(self, request, model):
+        """Возвращает значения ключа и направление из параметра cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            raw_values = payload['v']
+            if len(raw_values) != len(self.ordering):
+                raise ValueError
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, raw_values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(payload.get('r'))
+
+    def encode_cursor(self, instance, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value)
+        payload = {'v': values}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode())
+        return encoded.decode().rstrip('=')
+
+    def _get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'offset')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in ordering
+        )
+
+    @staticmethod
+    def _after(ordering, values):
+        """
+        Условие «строка идёт после values» в порядке ordering.
+
+        Отдельное нестрогое условие по первому полю позволяет БД начать
+        сканирование индекса сразу с нужной позиции.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        first_field = ordering[0]
+        first_lookup = 'lte' if first_field.startswith('-') else 'gte'
+        return Q(**{
+            f'{first_field.lstrip("-")}__{first_lookup}': values[0]
+        }) & condition
+
+
+class FoodgramPagination(LimitOffsetPagination):
+    """
+    Limit/offset-пагинация с опциональным keyset-режимом.
+
+    Keyset-режим включается параметром cursor (для первой страницы — пустым:
+    ?cursor=&limit=10) и доступен, если задан keyset_ordering.
+    """
+    keyset_ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (self.keyset_ordering
+                and KeysetPagination.cursor_query_param
+                in request.query_params):
+            self.keyset = KeysetPagination(self.keyset_ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(FoodgramPagination):
+    keyset_ordering = ('-pub_date', '-id')
+
+
+class UserPagination(FoodgramPagination):
+    keyset_ordering = ('username',)
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .exporters import ShoppingListPDFRenderer
+from .renderers import FastJSONRenderer
+from .versions import (
+    INGREDIENTS,
+    MEMBERSHIPS,
+    RECIPES,
+    get_versions,
+    membership_version,
+)
+
+PENDING = 'pending'
+FAILED = 'failed'
+READY = 'ready'
+
+
+def render_pdf(items, path):
+    """
+    Рисует PDF в файл path. Выполняется в дочернем процессе, поэтому
+    не обращается к БД: позиции списка передаются готовыми.
+    """
+    path = Path(path)
+    temp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(temp_path, 'wb') as file:
+        for block in ShoppingListPDFRenderer().stream(items):
+            file.write(block)
+    # Файл появляется целиком: опрос не увидит недописанный PDF.
+    os.replace(temp_path, path)
+    # Прежние версии списка этого пользователя больше не нужны.
+    for old in path.parent.glob('*.pdf'):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+
+class PDFExport:
+    """
+    Фоновая отрисовка PDF списка покупок в пуле процессов.
+
+    Версия списка — хэш его содержимого, поэтому неизменный список
+    отдаётся из уже готового файла. Хэш и состояние задачи (в работе
+    или ошибка) хранятся в общем кэше: опрос может прийти в любой
+    воркер и не перечитывает список из БД.
+
+    Пул свой у каждого процесса gunicorn: на хосте работает до
+    workers × SHOPPING_LIST_PDF_WORKERS процессов отрисовки.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version(items):
+        content = FastJSONRenderer().render(items)
+        return hashlib.sha256(content).hexdigest()[:32]
+
+    @staticmethod
+    def path(user_id, version):
+        return (Path(settings.SHOPPING_LIST_EXPORT_DIR)
+                / str(user_id) / f'{version}.pdf')
+
+    @staticmethod
+    def _key(user_id, version):
+        return f'shopping_list_pdf:{user_id}:{version}'
+
+    def get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=settings.SHOPPING_LIST_PDF_WORKERS)
+        return self._executor
+
+    @staticmethod
+    def _version_key(user_id):
+        # Список меняется с корзиной пользователя, составом рецептов и
+        # названиями ингредиентов; записи через API меняют эти версии.
+        versions = get_versions(
+            MEMBERSHIPS, membership_version(user_id), RECIPES, INGREDIENTS)
+        return f'shopping_list_version:{user_id}:' + ':'.join(
+            map(str, versions))
+
+    def current_version(self, user_id, load_items):
+        """
+        Версия списка покупок пользователя или None для пустого списка.
+        Позиции читаются через load_items только при промахе кэша.
+        """
+        key = self._version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            items = load_items()
+            version = self.version(items) if items else ''
+            cache.set(key, version, settings.MEMBERSHIP_SETS_CACHE_TIMEOUT)
+        return version or None
+
+    def status(self, user_id, version, load_items):
+        """
+        Возвращает состояние PDF версии version и ставит отрисовку в
+        очередь, если файла ещё нет. Ошибка сообщается один раз:
+        следующий опрос запускает отрисовку заново.
+        """
+        if self.path(user_id, version).exists():
+            return READY
+        key = self._key(user_id, version)
+        if cache.add(key, PENDING, settings.SHOPPING_LIST_PDF_TIMEOUT):
+            self.submit(user_id, version, load_items())
+            if self.path(user_id, version).exists():
+                return READY
+        if cache.get(key) == FAILED:
+            cache.delete(key)
+            return FAILED
+        return PENDING
+
+    def submit(self, user_id, version, items):
+        """
+        Запускает отрисовку. Любая ошибка, в том числе отказ пула
+        принять задачу, сохраняется в кэше как состояние FAILED.
+        """
+        path = self.path(user_id, version)
+        key = self._key(user_id, version)
+        executor = future = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if settings.SHOPPING_LIST_PDF_WORKERS:
+                executor = self.get_executor()
+                future = executor.submit(render_pdf, items, str(path))
+            else:
+                # Без пула (разработка, тесты) рисуем прямо в запросе.
+                render_pdf(items, path)
+        except Exception as error:
+            self._failed(key, error, executor)
+            return
+        if future is None:
+            cache.delete(key)
+        else:
+            future.add_done_callback(
+                partial(self._finished, key, executor))
+
+    def _failed(self, key, error, executor):
+        if isinstance(error, BrokenProcessPool):
+            # Аварийно завершённый процесс ломает весь пул: он больше
+            # не принимает задачи, и следующая создаст новый пул.
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+        cache.set(key, FAILED, settings.SHOPPING_LIST_PDF_TIMEOUT)
+
+    def _finished(self, key, executor, future):
+        error = future.exception()
+        if error is None:
+            cache.delete(key)
+        else:
+            self._failed(key, error, executor)
+
+
+shopping_list_pdf = PDFExport()
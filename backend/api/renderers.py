@@ -0,0 +1,32 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson указан в requirements.txt
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson.
+
+    Выдаёт тот же компактный UTF-8 JSON, что и стандартный JSONRenderer.
+    Типы, которые orjson не знает (Decimal, ленивые строки и т.п.),
+    сериализуются энкодером DRF. Форматированный вывод (indent) и
+    отсутствие orjson обрабатываются стандартной реализацией.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(
+                accepted_media_type or '', renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data,
+            default=self._encoder.default,
+            option=orjson.OPT_NON_STR_KEYS,
+        )
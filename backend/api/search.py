@@ -0,0 +1,298 @@
+import heapq
+import re
+import threading
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import cached_property
+from itertools import chain
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Func, TextField, Value
+from django.db.models.functions import Cast, Length, Upper
+
+from .serializers import IngredientSerializer
+from .versions import INGREDIENTS, get_versions
+from recipes.models import Ingredient
+
+# Доля триграмм запроса, которая должна найтись в названии.
+TRIGRAM_THRESHOLD = 0.5
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Ключ поиска: регистр не важен, «ё» и «е» не различаются."""
+    return text.casefold().replace('ё', 'е')
+
+
+def trigrams(text):
+    """
+    Множество триграмм слов строки, как в pg_trgm: перед словом два
+    пробела, после — один, поэтому начало слова весит больше.
+    """
+    result = set()
+    for word in WORD_RE.findall(text):
+        padded = f'  {word} '
+        result.update(
+            padded[start:start + 3] for start in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """
+    Триграммный индекс для поиска с опечатками.
+
+    Триграммы считаются не по строкам, а по словарю их слов: слов в каталоге
+    намного меньше, чем названий, поэтому запрос оценивает сотни слов
+    вместо десятков тысяч строк. Оценка слова — доля триграмм слова запроса,
+    найденных в нём (аналог word_similarity из pg_trgm): так недопечатанное
+    слово с опечаткой находит нужное. Строки упорядочены по числу найденных
+    слов запроса, затем по сумме лучших оценок их слов, затем по длине.
+    """
+
+    def __init__(self, keys):
+        self.lengths = [len(key) for key in keys]
+        vocabulary = {}
+        self.words = []
+        self.word_keys = []
+        for number, key in enumerate(keys):
+            word_ids = []
+            for word in set(WORD_RE.findall(key)):
+                word_id = vocabulary.setdefault(word, len(vocabulary))
+                if word_id == len(self.word_keys):
+                    self.word_keys.append([])
+                self.word_keys[word_id].append(number)
+                word_ids.append(word_id)
+            self.words.append(word_ids)
+        for numbers in self.word_keys:
+            numbers.sort(key=self._rank)
+        self.postings = defaultdict(list)
+        for word, word_id in vocabulary.items():
+            for gram in trigrams(word):
+                self.postings[gram].append(word_id)
+
+    def _rank(self, number):
+        return self.lengths[number], number
+
+    def _match_words(self, grams, threshold):
+        """{id слова: число общих триграмм} для слов не ниже порога."""
+        counts = Counter(chain.from_iterable(
+            self.postings.get(gram, ()) for gram in grams))
+        required = threshold * len(grams)
+        return {
+            word_id: common for word_id, common in counts.items()
+            if common >= required
+        }
+
+    def search(self, query, limit, threshold=TRIGRAM_THRESHOLD):
+        """До limit номеров строк, похожих на query, по убыванию оценки."""
+        query_grams = [trigrams(word) for word in set(WORD_RE.findall(query))]
+        if not query_grams:
+            return []
+        matches = [
+            self._match_words(grams, threshold) for grams in query_grams]
+        if len(matches) == 1:
+            return self._search_word(matches[0], limit)
+        # Сначала строки, где нашлись все слова запроса: их немного,
+        # и они находятся пересечением множеств без цикла по строкам.
+        candidates = set.intersection(*(
+            set().union(*(self.word_keys[word_id] for word_id in matched))
+            for matched in matches
+        ))
+        if len(candidates) < limit:
+            for matched in matches:
+                candidates.update(self._search_word(matched, limit))
+        ranked = []
+        for number in candidates:
+            hits, score = 0, 0
+            word_ids = self.words[number]
+            for grams, matched in zip(query_grams, matches):
+                common = max(
+                    (matched.get(word_id, 0) for word_id in word_ids),
+                    default=0,
+                )
+                if common:
+                    hits += 1
+                    score += common / len(grams)
+            ranked.append((-hits, -score, *self._rank(number)))
+        return [number for *_, number in heapq.nsmallest(limit, ranked)]
+
+    def _search_word(self, matched, limit):
+        # Один запрос — одно слово: строки берутся из списков слов в порядке
+        # убывания оценки, а внутри оценки — слиянием списков по длине.
+        result = []
+        found = set()
+        by_common = defaultdict(list)
+        for word_id, common in matched.items():
+            by_common[common].append(word_id)
+        for common in sorted(by_common, reverse=True):
+            for number in heapq.merge(
+                *(self.word_keys[word_id] for word_id in by_common[common]),
+                key=self._rank,
+            ):
+                if number not in found:
+                    found.add(number)
+                    result.append(number)
+                    if len(result) == limit:
+                        return result
+        return result
+
+
+class PrefixIndex:
+    """
+    Отсортированный индекс строк для поиска по префиксу и подстроке.
+
+    Префиксные запросы решаются бинарным поиском по отсортированным ключам.
+    Для подстрок хранится массив суффиксов (номер ключа, смещение),
+    отсортированный по тексту суффикса: подстрока — это префикс одного из
+    суффиксов, поэтому она тоже находится бинарным поиском. Индекс триграмм
+    для нечёткого поиска строится при первом таком запросе.
+    """
+
+    def __init__(self, items, key):
+        decorated = sorted(
+            ((normalize(key(item)), position, item)
+             for position, item in enumerate(items)),
+            key=lambda entry: entry[:2],
+        )
+        self.keys = [entry[0] for entry in decorated]
+        self.items = [entry[2] for entry in decorated]
+        self.suffixes = sorted(
+            ((number, offset)
+             for number, text in enumerate(self.keys)
+             for offset in range(1, len(text))),
+            key=self._suffix,
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _suffix(self, entry):
+        number, offset = entry
+        return self.keys[number][offset:]
+
+    def _prefix_range(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', lo=start)
+        return range(start, end)
+
+    @cached_property
+    def trigrams(self):
+        return TrigramIndex(self.keys)
+
+    def search(self, query, limit, fuzzy=False):
+        """
+        Возвращает до limit элементов: сначала начинающиеся с query,
+        затем содержащие query в середине (внутри групп — по алфавиту),
+        а в нечётком режиме — похожие на query по триграммам.
+        """
+        query = normalize(query)
+        prefix_hits = self._prefix_range(query)
+        numbers = list(prefix_hits[:limit])
+        if len(numbers) < limit:
+            start = bisect_left(self.suffixes, query, key=self._suffix)
+            end = bisect_left(
+                self.suffixes, query + '\uffff', lo=start, key=self._suffix)
+            substring_hits = sorted({
+                number for number, _ in self.suffixes[start:end]
+                if number not in prefix_hits
+            })
+            numbers.extend(substring_hits[:limit - len(numbers)])
+        if fuzzy and len(numbers) < limit:
+            found = set(numbers)
+            for number in self.trigrams.search(query, limit + len(found)):
+                if number not in found:
+                    numbers.append(number)
+                    if len(numbers) == limit:
+                        break
+        return [self.items[number] for number in numbers]
+
+
+class IngredientSearch:
+    """
+    Поисковый индекс ингредиентов в памяти процесса.
+
+    Хранит готовые представления ингредиентов и перестраивается, когда
+    меняется версия каталога, поэтому запрос автодополнения не обращается
+    к БД.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._has_pg_trgm = None
+        self._lock = threading.Lock()
+
+    def get_index(self):
+        version, = get_versions(INGREDIENTS)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._index = self.build()
+                    self._version = version
+        return self._index
+
+    def build(self):
+        return PrefixIndex(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data,
+            key=lambda item: item['name'],
+        )
+
+    def search(self, query, limit, fuzzy=False):
+        index = self.get_index()
+        if not (fuzzy and self.use_pg_trgm()):
+            return index.search(query, limit, fuzzy)
+        result = index.search(query, limit)
+        if len(result) < limit:
+            result.extend(IngredientSerializer(
+                self.pg_trgm_search(
+                    query,
+                    exclude=[item['id'] for item in result],
+                    limit=limit - len(result),
+                ),
+                many=True,
+            ).data)
+        return result
+
+    def use_pg_trgm(self):
+        """Нечёткий поиск выполняется в PostgreSQL, если есть pg_trgm."""
+        if connection.vendor != 'postgresql':
+            return False
+        if self._has_pg_trgm is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                self._has_pg_trgm = cursor.fetchone() is not None
+        return self._has_pg_trgm
+
+    @staticmethod
+    def pg_trgm_search(query, exclude, limit):
+        """
+        Похожие ингредиенты по оператору <% из pg_trgm.
+
+        Выражение UPPER(name::text) совпадает с GIN-индексом
+        ingredient_name_upper_trgm_idx, порог сходства задаёт параметр
+        pg_trgm.word_similarity_threshold.
+        """
+        name = Upper(Cast('name', TextField()))
+        query = Upper(Value(query, output_field=TextField()))
+        return (
+            Ingredient.objects
+            .filter(Func(
+                query, name,
+                template='%(expressions)s',
+                arg_joiner=' <%% ',
+                output_field=BooleanField(),
+            ))
+            .exclude(id__in=exclude)
+            .annotate(score=Func(
+                query, name,
+                function='WORD_SIMILARITY',
+                output_field=FloatField(),
+            ))
+            .order_by('-score', Length('name'), 'name')[:limit]
+        )
+
+
+ingredient_search = IngredientSearch()
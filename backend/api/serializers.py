@@ -1,57 +1,138 @@
+from collections import Counter
+from collections.abc import Mapping
+from operator import attrgetter
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
-
+from rest_framework.fields import SkipField
+from rest_framework.relations import MANY_RELATION_KWARGS, PKOnlyObject
+
+from .fragments import get_fragment, invalidate_fragment, set_fragment
+from .loaders import (
+    FavoritedLoader,
+    InShoppingCartLoader,
+    SubscribedLoader,
+    get_loader,
+)
 from recipes.constants import (
+    MAX_BULK_RECIPES,
     MAX_COOKING_TIME,
     MAX_INGREDIENT_AMOUNT,
     MIN_COOKING_TIME,
     MIN_INGREDIENT_AMOUNT,
 )
-from recipes.models import (
-    Favorite,
-    Follow,
-    Ingredient,
-    IngredientAmount,
-    Recipe,
-    ShoppingCart,
-    Tag,
-)
+from recipes.counters import change_counter
+from recipes.feeds import fan_out
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.shopping_lists import change_shopping_lists
 from recipes.validators import validate_recipe
 
 User = get_user_model()
 
 
-class UserSerializer(DjoserUserSerializer):
+class FieldPlanMixin:
+    """
+    Быстрый to_representation по заранее составленному плану полей.
+
+    Для простых полей (числа, строки, ReadOnlyField) значение берётся
+    напрямую из атрибута объекта без вызова get_attribute/to_representation
+    поля; остальные поля обрабатываются как в DRF. План строится один раз
+    на экземпляр сериализатора, то есть один раз на страницу для many=True.
+    """
+    use_field_plan = True
+    plain_field_classes = (
+        serializers.IntegerField,
+        serializers.CharField,
+        serializers.ReadOnlyField,
+    )
+
+    def get_field_plan(self):
+        plan = []
+        for field in self._readable_fields:
+            if (type(field) in self.plain_field_classes
+                    and field.source != '*'):
+                plan.append(
+                    (field.field_name, attrgetter(field.source), None))
+            else:
+                plan.append((field.field_name, None, field))
+        return plan
+
+    def to_representation(self, instance):
+        if not self.use_field_plan or isinstance(instance, Mapping):
+            return super().to_representation(instance)
+        plan = self.__dict__.get('_field_plan')
+        if plan is None:
+            plan = self._field_plan = self.get_field_plan()
+
+        data = {}
+        for name, getter, field in plan:
+            if getter is not None:
+                data[name] = getter(instance)
+                continue
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = (
+                attribute.pk if isinstance(attribute, PKOnlyObject)
+                else attribute
+            )
+            data[name] = (
+                None if check_for_none is None
+                else field.to_representation(attribute)
+            )
+        return data
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """
+    Список, который перед сериализацией сообщает дочернему сериализатору
+    все объекты страницы, чтобы загрузчики ответили одним запросом.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        instances = list(iterable)
+        self.child.prime_loaders(instances)
+        return super().to_representation(instances)
+
+
+class UserSerializer(FieldPlanMixin, DjoserUserSerializer):
     avatar = Base64ImageField(required=False, allow_null=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(DjoserUserSerializer.Meta):
         model = User
         fields = DjoserUserSerializer.Meta.fields + ('is_subscribed', 'avatar')
+        list_serializer_class = BatchListSerializer
+
+    def prime_loaders(self, instances):
+        get_loader(self.context, SubscribedLoader).prime(
+            user.id for user in instances)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj).exists()
+        return get_loader(self.context, SubscribedLoader).load(obj.id)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(FieldPlanMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(FieldPlanMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
 
-class IngredientInRecipeSerializer(serializers.ModelSerializer):
+class IngredientInRecipeSerializer(FieldPlanMixin,
+                                   serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -62,12 +143,89 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+def resolve_ids(queryset, ids, not_found_message, duplicate_message):
+    """
+    Загружает объекты по списку id одним запросом in_bulk.
+
+    Повторы и все ненайденные id собираются в одну ошибку, чтобы клиент
+    увидел их сразу, а не по одному за запрос.
+    """
+    duplicates = sorted(pk for pk, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        raise serializers.ValidationError(
+            duplicate_message.format(ids=', '.join(map(str, duplicates))))
+    objects = queryset.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            not_found_message.format(ids=', '.join(map(str, missing))))
+    return [objects[pk] for pk in ids]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список связанных объектов, загружаемый одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        ids = []
+        for pk in data:
+            if isinstance(pk, bool):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                ids.append(int(pk))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+        return resolve_ids(
+            child.get_queryset(), ids,
+            child.error_messages['does_not_exist_bulk'],
+            child.error_messages['duplicates'],
+        )
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при many=True грузит все id сразу."""
+    default_error_messages = {
+        'does_not_exist_bulk': 'Объекты с id {ids} не найдены.',
+        'duplicates': 'Значения не должны повторяться: {ids}.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class IngredientWriteListSerializer(serializers.ListSerializer):
+    """
+    Ингредиенты рецепта: количество проверяется у каждого элемента,
+    а сами ингредиенты загружаются одним запросом на весь список.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = resolve_ids(
+            Ingredient.objects.all(),
+            [item['id'] for item in items],
+            'Ингредиенты с id {ids} не найдены.',
+            'Ингредиенты не должны повторяться: {ids}.',
+        )
+        return [
+            {**item, 'id': ingredient}
+            for item, ingredient in zip(items, ingredients)
+        ]
+
+
 class IngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
+    id = serializers.IntegerField(
         error_messages={
-            'does_not_exist': 'Ингредиент с таким id не найден.',
-            'incorrect_type': 'Некорректный тип значения для поля id.',
+            'invalid': 'Некорректный тип значения для поля id.',
         }
     )
     amount = serializers.IntegerField(
@@ -85,9 +243,64 @@ class IngredientWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = IngredientAmount
         fields = ('id', 'amount')
+        list_serializer_class = IngredientWriteListSerializer
+
+
+class SparseFieldsMixin:
+    """
+    Выбор полей через ?fields=, ?omit= и ?view=compact.
+
+    get_requested_fields() возвращает кортеж выбранных полей или None,
+    если нужно полное представление; view использует его, чтобы не
+    загружать из БД лишние колонки.
+    """
+    compact_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = self.get_requested_fields(
+            self.context.get('request'))
+        if self.requested_fields is not None:
+            for name in set(self.fields) - set(self.requested_fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        if request is None:
+            return None
+        params = request.query_params
+        all_fields = cls.Meta.fields
+        if params.get('view') == 'compact':
+            selected = set(cls.compact_fields)
+        elif params.get('fields'):
+            selected = set(params['fields'].split(','))
+        else:
+            selected = set(all_fields)
+        selected -= set(params.get('omit', '').split(','))
+        requested = tuple(
+            name for name in all_fields if name in selected or name == 'id')
+        if len(requested) == len(all_fields):
+            return None
+        return requested
+
+
+class RecipeListSerializer(SparseFieldsMixin, FieldPlanMixin,
+                           serializers.ModelSerializer):
+    """
+    Полное представление рецепта.
+
+    Общая для всех пользователей часть берётся из кэша фрагментов,
+    поверх неё подставляются флаги текущего пользователя. При выборе
+    отдельных полей кэш не используется.
+    """
+    prefetch_fields = {
+        'tags': 'tags',
+        'ingredients': 'ingredient_amounts__ingredient',
+        'author': 'author',
+    }
+    compact_fields = ('id', 'name', 'image', 'cooking_time')
+    deferrable_fields = ('name', 'image', 'text', 'cooking_time')
 
-
-class RecipeListSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = IngredientInRecipeSerializer(
@@ -97,8 +310,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
     )
     image = Base64ImageField(read_only=True)
 
-    is_favorited = serializers.BooleanField(default=False)
-    is_in_shopping_cart = serializers.BooleanField(default=False)
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -114,31 +327,66 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = BatchListSerializer
 
-    def get_ingredients(self, obj):
-        ingredients = IngredientAmount.objects.filter(recipe=obj)
-        return IngredientInRecipeSerializer(ingredients, many=True).data
+    def get_prefetch_lookups(self):
+        return [
+            lookup for field, lookup in self.prefetch_fields.items()
+            if field in self.fields
+        ]
+
+    def prime_loaders(self, instances):
+        recipe_ids = [recipe.id for recipe in instances]
+        if 'is_favorited' in self.fields:
+            get_loader(self.context, FavoritedLoader).prime(recipe_ids)
+        if 'is_in_shopping_cart' in self.fields:
+            get_loader(self.context, InShoppingCartLoader).prime(recipe_ids)
+        if 'author' in self.fields:
+            get_loader(self.context, SubscribedLoader).prime(
+                recipe.author_id for recipe in instances)
+        # Связанные объекты нужны только рецептам, которых нет в кэше.
+        misses = [
+            recipe for recipe in instances
+            if self.requested_fields is not None
+            or get_fragment(recipe, self.context) is None
+        ]
+        prefetch_related_objects(misses, *self.get_prefetch_lookups())
+
+    def to_representation(self, instance):
+        if self.requested_fields is not None:
+            return super().to_representation(instance)
+
+        fragment = get_fragment(instance, self.context)
+        if fragment is None:
+            prefetch_related_objects([instance], *self.get_prefetch_lookups())
+            fragment = super().to_representation(instance)
+            set_fragment(instance, self.context, fragment)
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': get_loader(
+                    self.context, SubscribedLoader).load(instance.author_id),
+            },
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+        }
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=user, recipe=obj).exists()
+        return get_loader(self.context, FavoritedLoader).load(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
+        return get_loader(self.context, InShoppingCartLoader).load(obj.id)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientWriteSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
         error_messages={
-            'does_not_exist': 'Тег с таким id не найден.',
+            'does_not_exist_bulk': 'Теги с id {ids} не найдены.',
+            'duplicates': 'Теги не должны повторяться: {ids}.',
             'incorrect_type': 'Некорректный тип значения для поля tags.',
         }
     )
@@ -168,21 +416,6 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         validators = (validate_recipe,)
 
-    def validate(self, data):
-        ingredients = data.get('ingredients')
-        if not ingredients:
-            raise serializers.ValidationError({
-                'ingredients': 'Необходимо указать хотя бы один ингредиент.'
-            })
-
-        ingredient_ids = [item['id'] for item in ingredients]
-        if len(ingredient_ids) != len(set(ingredient_ids)):
-            raise serializers.ValidationError({
-                'ingredients': 'Ингредиенты не должны повторяться.',
-            })
-
-        return data
-
     def _create_ingredient_amounts(self, recipe, ingredients_data):
         """Создаём связь ингредиентов и рецепта одной операцией."""
         ingredient_amounts = [
@@ -203,8 +436,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
 
         recipe = super().create({**validated_data, 'author': user})
-        recipe.tags.set(tags)
+        change_counter(User, user.id, 'recipes_count', 1)
+        recipe.tags.add(*tags)
         self._create_ingredient_amounts(recipe, ingredients_data)
+        fan_out(recipe)
+        invalidate_fragment(recipe.id)
         return recipe
 
     @transaction.atomic
@@ -219,9 +455,14 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             recipe.tags.set(tags)
 
         if ingredients_data is not None:
+            # Сводные списки покупок тех, у кого рецепт в корзине:
+            # вычитаем старый состав и прибавляем новый.
+            change_shopping_lists([recipe.id], -1)
             recipe.ingredient_amounts.all().delete()
             self._create_ingredient_amounts(recipe, ingredients_data)
+            change_shopping_lists([recipe.id], 1)
 
+        invalidate_fragment(recipe.id)
         return recipe
 
     def to_representation(self, instance):
@@ -229,7 +470,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return RecipeListSerializer(instance, context=self.context).data
 
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
+class RecipeMinifiedSerializer(FieldPlanMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
@@ -239,38 +480,77 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
 class FollowSerializer(UserSerializer):
     """Сериализатор для вывода подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
+    def prime_loaders(self, instances):
+        super().prime_loaders(instances)
+        self.prefetch_recipes(instances)
+
+    def prefetch_recipes(self, authors):
+        """
+        Последние recipes_limit рецептов каждого автора одним запросом:
+        срез в Prefetch превращается в ROW_NUMBER() OVER (PARTITION BY
+        author_id) и читается по индексу (author, -pub_date).
+        """
+        authors = [
+            author for author in authors
+            if not hasattr(author, 'latest_recipes')
+        ]
+        if not authors:
+            return
+        limit = self.context.get(
+            'recipes_limit', settings.SUBSCRIPTION_RECIPES_LIMIT)
+        if not limit:
+            for author in authors:
+                author.latest_recipes = []
+            return
+        recipes = Recipe.objects.only(
+            'author', *RecipeMinifiedSerializer.Meta.fields)
+        prefetch_related_objects(authors, Prefetch(
+            'recipes', queryset=recipes[:limit], to_attr='latest_recipes'))
+
     def get_recipes(self, obj):
         """Выводим сокращённый список рецептов автора."""
-        request = self.context.get('request')
-        recipes = obj.recipes.all()
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            recipes = recipes[:int(limit)]
-        return RecipeMinifiedSerializer(recipes, many=True,
-                                        context={'request': request}).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
+        self.prefetch_recipes([obj])
+        return RecipeMinifiedSerializer(
+            obj.latest_recipes, many=True,
+            context={'request': self.context.get('request')},
+        ).data
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    """Параметр recipes_limit: неотрицательное целое, не больше предела."""
+    recipes_limit = serializers.IntegerField(
+        min_value=0,
+        required=False,
+        error_messages={
+            'invalid': 'recipes_limit должен быть целым числом.',
+            'min_value': 'recipes_limit не может быть отрицательным.',
+        },
+    )
 
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
+    def validate_recipes_limit(self, value):
+        return min(value, settings.SUBSCRIPTION_RECIPES_LIMIT)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления или удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(
+            min_value=1,
+            error_messages={
+                'invalid': 'Некорректный тип значения id рецепта.',
+                'min_value': 'Некорректный id рецепта.',
+            },
+        ),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+        error_messages={
+            'empty': 'Нужно указать хотя бы один рецепт.',
+            'max_length': ('Нельзя передать больше '
+                           f'{MAX_BULK_RECIPES} рецептов за раз.'),
+        },
+    )
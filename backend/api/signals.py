@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .versions import (
+    INGREDIENTS,
+    MEMBERSHIPS,
+    RECIPES,
+    TAGS,
+    USERS,
+    bump_version,
+    membership_version,
+)
+from recipes.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    User,
+)
+from recipes.signals import bulk_changed
+
+VERSIONED_MODELS = {
+    Recipe: RECIPES,
+    Tag: TAGS,
+    Ingredient: INGREDIENTS,
+}
+MEMBERSHIP_MODELS = (Favorite, ShoppingCart, Follow)
+# Поля пользователя, встроенные в ответы с рецептами (автор рецепта).
+USER_RESPONSE_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'avatar'))
+
+
+def bump_model_version(sender, **kwargs):
+    """Меняет версию ресурса при любом изменении его строк через ORM."""
+    bump_version(VERSIONED_MODELS[sender])
+
+
+def bump_user_version(sender, created=False, update_fields=None, **kwargs):
+    """
+    Меняет версию авторов только при изменении полей из ответов:
+    вход (last_login), смена пароля и регистрация её не трогают.
+    """
+    if created:
+        return
+    if update_fields is not None and not USER_RESPONSE_FIELDS & set(
+            update_fields):
+        return
+    bump_version(USERS)
+
+
+def bump_membership_version(sender, instance, **kwargs):
+    bump_version(membership_version(instance.user_id))
+
+
+def bump_memberships_on_delete(sender, **kwargs):
+    """
+    Удаление рецепта или пользователя каскадно удаляет связи. У моделей
+    связей нет обработчиков post_delete, чтобы Django удалял их одним
+    DELETE без выборки строк, поэтому версия связей меняется здесь.
+    """
+    bump_version(MEMBERSHIPS)
+
+
+def bump_bulk_version(sender, **kwargs):
+    """Для связей неизвестно, чьи списки затронуты: общая версия."""
+    bump_version(
+        MEMBERSHIPS if sender in MEMBERSHIP_MODELS
+        else USERS if sender is User
+        else VERSIONED_MODELS[sender])
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model)
+    post_delete.connect(bump_model_version, sender=model)
+post_save.connect(bump_user_version, sender=User)
+post_delete.connect(bump_user_version, sender=User)
+for model in (Recipe, User):
+    post_delete.connect(bump_memberships_on_delete, sender=model)
+for model in MEMBERSHIP_MODELS:
+    # Удаления связей идут через API, который сам меняет версию.
+    post_save.connect(bump_membership_version, sender=model)
+for model in (*VERSIONED_MODELS, User, *MEMBERSHIP_MODELS):
+    bulk_changed.connect(bump_bulk_version, sender=model)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_snapshot(sender, instance, created, **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя."""
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_snapshot(sender, instance, **kwargs):
+    """Выход (/api/auth/token/logout/) и удаление токена."""
+    invalidate_tokens(instance.key)
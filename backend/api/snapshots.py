@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+import threading
+
+from typing import NamedTuple
+
+from .renderers import FastJSONRenderer
+from .serializers import IngredientSerializer
+from .versions import INGREDIENTS, get_versions
+from recipes.models import Ingredient
+
+
+def _quality(params):
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Разрешает ли заголовок Accept-Encoding ответ в gzip (RFC 9110,
+    12.5.3): gzip или, если он не назван, * с ненулевым q.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if coding:
+            qualities[coding] = _quality(params)
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class SnapshotBlob(NamedTuple):
+    version: str
+    etag: str
+    content: bytes
+    gzipped: bytes
+
+
+class Snapshot:
+    """
+    Готовый JSON ресурса целиком, сжатый заранее, в памяти процесса.
+
+    Снимок собирается заново только при смене версии ресурса, а версия
+    снимка — хэш его содержимого, поэтому одинаковые данные в разных
+    процессах дают одинаковый ETag.
+    """
+
+    def __init__(self, version_name, get_data):
+        self.version_name = version_name
+        self.get_data = get_data
+        self._blob = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version, = get_versions(self.version_name)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._blob = self.build()
+                    self._version = version
+        return self._blob
+
+    def build(self):
+        content = FastJSONRenderer().render(self.get_data())
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        return SnapshotBlob(
+            version=digest,
+            etag=f'"{digest}"',
+            content=content,
+            gzipped=gzip.compress(content, compresslevel=9, mtime=0),
+        )
+
+
+ingredient_snapshot = Snapshot(
+    INGREDIENTS,
+    lambda: IngredientSerializer(Ingredient.objects.all(), many=True).data,
+)
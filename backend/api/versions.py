@@ -0,0 +1,46 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+USERS = 'users'
+# Общая версия избранного, корзин и подписок всех пользователей: меняется
+# при массовых изменениях, после которых неизвестно, чьи списки затронуты.
+MEMBERSHIPS = 'memberships'
+
+
+def membership_version(user_id):
+    """Версия избранного, списка покупок и подписок пользователя."""
+    return f'memberships:{user_id}'
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def _new_version():
+    # Метка времени вместо счётчика: если ключ вытеснен из кэша, новое
+    # значение не совпадёт ни с одной из уже выданных версий.
+    return time.time_ns()
+
+
+def get_versions(*names):
+    """Возвращает версии ресурсов (в наносекундах) в порядке names."""
+    keys = [_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            version = _new_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            found[key] = version
+    return [found[key] for key in keys]
+
+
+def bump_version(*names):
+    """Меняет версии ресурсов после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: cache.set_many(
+        {_key(name): _new_version() for name in names}, timeout=None))
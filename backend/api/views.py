@@ -1,14 +1,28 @@
 import base64
 
-from django.db.models import BooleanField, Exists, OuterRef, Sum, Value
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer, UserCreateSerializer
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
@@ -18,70 +32,151 @@ from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from .exporters import SHOPPING_LIST_RENDERERS, ShoppingListPDFRenderer
 from .filters import RecipeFilter
+from .fragments import invalidate_fragment
+from .mixins import AnonymousResponseCacheMixin, ConditionalGetMixin
+from .pagination import KeysetPagination, RecipePagination, UserPagination
+from .pdf_exports import FAILED, PENDING, READY, shopping_list_pdf
 from .permissions import IsAuthorOrReadOnly
+from .search import ingredient_search
 from .serializers import (
-    FavoriteSerializer,
     FollowSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
+    RecipeIdsSerializer,
     RecipeListSerializer,
     RecipeMinifiedSerializer,
-    ShoppingCartSerializer,
+    RecipesLimitSerializer,
     TagSerializer,
     UserSerializer,
 )
+from .snapshots import accepts_gzip, ingredient_snapshot
+from .versions import (
+    INGREDIENTS,
+    RECIPES,
+    TAGS,
+    USERS,
+    bump_version,
+    membership_version,
+)
+from recipes.counters import change_counter, change_counters
+from recipes.feeds import feed_page_ids, follow_author, unfollow_author
+from recipes.memberships import (
+    add_membership,
+    add_memberships,
+    remove_membership,
+    remove_memberships,
+)
 from recipes.models import (
     Favorite,
     Follow,
     Ingredient,
-    IngredientAmount,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
     User,
 )
+from recipes.shopping_lists import change_shopping_lists
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    version_names = (TAGS,)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filterset_class = SearchFilter
+    version_names = (INGREDIENTS,)
 
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('name'):
+            return super().list(request, *args, **kwargs)
+        return self._conditional(self.search, request)
+
+    def search(self, request):
+        """Автодополнение по названию из индекса в памяти процесса."""
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        try:
+            limit = min(int(request.query_params['limit']), limit)
+        except (KeyError, ValueError):
+            pass
+        if limit <= 0:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        fuzzy = request.query_params.get('fuzzy', '').lower() in (
+            'true', '1')
+        return Response(ingredient_search.search(
+            request.query_params['name'], limit, fuzzy))
+
+    @action(detail=False, url_path='snapshot')
+    def snapshot(self, request):
+        """
+        Весь каталог одним заранее сжатым JSON.
+
+        Ответ на ?version=<версия> не меняется никогда и кэшируется
+        надолго; запрос устаревшей версии перенаправляется на актуальную.
+        """
+        snapshot = ingredient_snapshot.get()
+        version = request.query_params.get('version')
+        if version and version != snapshot.version:
+            return redirect(
+                f'{request.path}?{urlencode({"version": snapshot.version})}')
+        response = get_conditional_response(request, etag=snapshot.etag)
+        if response is None:
+            if accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+                response = HttpResponse(
+                    snapshot.gzipped, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(
+                    snapshot.content, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        response['X-Snapshot-Version'] = snapshot.version
+        if version:
+            patch_cache_control(
+                response, public=True, immutable=True,
+                max_age=settings.SNAPSHOT_IMMUTABLE_MAX_AGE)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.SNAPSHOT_MAX_AGE)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
-class RecipeViewSet(ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousResponseCacheMixin,
+                    ModelViewSet):
+    # В представление рецепта встроены теги, ингредиенты и автор,
+    # а флаги зависят от избранного, корзины и подписок пользователя.
+    version_names = (RECIPES, TAGS, INGREDIENTS, USERS)
+    per_user_versions = True
+    response_cache_params = (
+        'tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+        'limit', 'offset', 'cursor', 'fields', 'omit', 'view',
+    )
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly)
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = Recipe.objects.all().prefetch_related(
-            'tags', 'ingredient_amounts__ingredient', 'author'
-        )
-
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_favorited=Exists(Favorite.objects.filter(
-                    user=user, recipe=OuterRef('pk'))),
-                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
-                    user=user, recipe=OuterRef('pk'))),
-            )
-        else:
-            queryset = queryset.annotate(
-                is_favorited=Value(False, output_field=BooleanField()),
-                is_in_shopping_cart=Value(False, output_field=BooleanField()),
-            )
-
+        # Связанные объекты догружаются сериализатором только для рецептов,
+        # которых нет в кэше фрагментов, а флаги текущего пользователя
+        # вычисляются пакетными загрузчиками.
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            fields = RecipeListSerializer.get_requested_fields(self.request)
+            if fields is not None:
+                queryset = queryset.defer(*(
+                    name for name in RecipeListSerializer.deferrable_fields
+                    if name not in fields
+                ))
         return queryset
 
     def get_serializer_class(self):
@@ -89,52 +184,137 @@ class RecipeViewSet(ModelViewSet):
         mapping = {
             'list': RecipeListSerializer,
             'retrieve': RecipeListSerializer,
+            'feed': RecipeListSerializer,
             'favorite': RecipeMinifiedSerializer,
             'shopping_cart': RecipeMinifiedSerializer,
-            'add_favorite': FavoriteSerializer,
-            'add_shopping_cart': ShoppingCartSerializer,
+            'bulk_favorite': RecipeIdsSerializer,
+            'bulk_delete_favorite': RecipeIdsSerializer,
+            'bulk_shopping_cart': RecipeIdsSerializer,
+            'bulk_delete_shopping_cart': RecipeIdsSerializer,
             'create': RecipeCreateSerializer,
             'update': RecipeCreateSerializer,
             'partial_update': RecipeCreateSerializer,
         }
         return mapping.get(self.action, RecipeCreateSerializer)
 
-    def _get_item_or_error(self, model, user, recipe, error_message):
-        """Возвращает объект для удаления или ошибку, если его нет."""
-        item = model.objects.filter(user=user, recipe=recipe)
-        if not item.exists():
-            return Response(error_message, status=status.HTTP_400_BAD_REQUEST)
-        return item
-
-    def _add_recipe(self, request, recipe, model, serializer_class,
-                    existing_error_message):
-        """Общий метод для добавления рецепта (в избранное или корзину)."""
+    @staticmethod
+    def _recipe_id_or_404(pk):
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+
+    def _membership_error(self, recipe_id, error_message):
+        """404, если рецепта нет, иначе ошибка 400 с error_message."""
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            raise Http404
+        return Response(error_message, status=status.HTTP_400_BAD_REQUEST)
+
+    def _add_recipe(self, request, pk, model, counter_field,
+                    existing_error_message, shopping_list=False):
+        """
+        Общий метод для добавления рецепта (в избранное или корзину).
+
+        Обычно это два запроса: вставка с ON CONFLICT DO NOTHING и
+        увеличение счётчика, возвращающее поля для ответа.
+        """
         user = request.user
-
-        if model.objects.filter(user=user, recipe=recipe).exists():
-            return Response(existing_error_message,
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        serializer = serializer_class(
-            data={'user': user.id, 'recipe': recipe.id},
-            context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        recipe_id = self._recipe_id_or_404(pk)
+        with transaction.atomic():
+            recipe = add_membership(
+                model, user.id, recipe_id, counter_field,
+                RecipeMinifiedSerializer.Meta.fields,
+            )
+            if recipe is None:
+                return self._membership_error(
+                    recipe_id, existing_error_message)
+            if shopping_list:
+                change_shopping_lists([recipe_id], 1, user_id=user.id)
+            bump_version(membership_version(user.id))
 
         return Response(
             RecipeMinifiedSerializer(
                 recipe, context={'request': request}).data,
             status=status.HTTP_201_CREATED)
 
-    def _remove_recipe(self, model, recipe, user, non_existing_error_message):
+    def _remove_recipe(self, request, pk, model, counter_field,
+                       non_existing_error_message, shopping_list=False):
         """Общий метод для удаления рецепта (из избранного или корзины)."""
-        item = self._get_item_or_error(
-            model, user, recipe, non_existing_error_message)
-        if isinstance(item, Response):
-            return item
-        item.delete()
+        user = request.user
+        recipe_id = self._recipe_id_or_404(pk)
+        with transaction.atomic():
+            if not remove_membership(model, user.id, recipe_id,
+                                     counter_field):
+                return self._membership_error(
+                    recipe_id, non_existing_error_message)
+            if shopping_list:
+                change_shopping_lists([recipe_id], -1, user_id=user.id)
+            bump_version(membership_version(user.id))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _bulk_change(self, request, model, counter_field,
+                     shopping_list=False):
+        """
+        Пакетно добавляет (POST) или убирает (DELETE) рецепты из
+        избранного или корзины и сообщает результат по каждому id.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+        with transaction.atomic():
+            if request.method == 'POST':
+                changed, found = add_memberships(model, user.id, recipe_ids)
+                delta = 1
+            else:
+                changed, found = remove_memberships(
+                    model, user.id, recipe_ids)
+                delta = -1
+            if changed:
+                change_counters(Recipe, changed, counter_field, delta)
+                if shopping_list:
+                    change_shopping_lists(changed, delta, user_id=user.id)
+                bump_version(membership_version(user.id))
+
+        done, skipped = (
+            ('added', 'exists') if delta > 0 else ('removed', 'not_in_list'))
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    done if recipe_id in changed
+                    else skipped if recipe_id in found
+                    else 'not_found'
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+        change_shopping_lists([instance.id], -1)
+        invalidate_fragment(instance.id)
+        instance.delete()
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Лента новых рецептов авторов, на которых подписан пользователь.
+
+        Читается из ленты пользователя (fan-out on write) и рецептов
+        популярных авторов (fan-in), всегда с keyset-пагинацией: id
+        рецептов страницы выбираются по индексам, рецепты грузятся по id.
+        """
+        paginator = KeysetPagination(RecipePagination.keyset_ordering)
+        after, reverse = paginator.decode_cursor(request, Recipe)
+        recipe_ids = feed_page_ids(
+            request.user, paginator.get_limit(request) + 1, after, reverse)
+        page = paginator.paginate_queryset(
+            Recipe.objects.filter(pk__in=recipe_ids), request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         """Возвращает короткую ссылку на рецепт без сохранения в БД."""
@@ -165,23 +345,22 @@ class RecipeViewSet(ModelViewSet):
             methods=['post'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
         return self._add_recipe(
             request,
-            recipe,
+            pk,
             Favorite,
-            FavoriteSerializer,
+            counter_field='favorites_count',
             existing_error_message={'errors': (
                 'Рецепт уже добавлен в избранное.')},
         )
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
         return self._remove_recipe(
+            request,
+            pk,
             Favorite,
-            recipe,
-            request.user,
+            counter_field='favorites_count',
             non_existing_error_message={'errors': 'Рецепта нет в избранном.'},
         )
 
@@ -189,65 +368,180 @@ class RecipeViewSet(ModelViewSet):
             methods=['post'],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
         return self._add_recipe(
             request,
-            recipe,
+            pk,
             ShoppingCart,
-            ShoppingCartSerializer,
+            counter_field='in_carts_count',
             existing_error_message={'errors': 'Рецепт уже в списке покупок.'},
+            shopping_list=True,
         )
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
         return self._remove_recipe(
+            request,
+            pk,
             ShoppingCart,
-            recipe,
-            request.user,
+            counter_field='in_carts_count',
             non_existing_error_message={'errors': (
                 'Рецепта нет в списке покупок.')},
+            shopping_list=True,
         )
 
-    @action(detail=False, methods=['get'], url_path='download_shopping_cart')
+    @action(detail=False,
+            methods=['post'],
+            url_path='favorite',
+            url_name='favorite-bulk',
+            permission_classes=[IsAuthenticated])
+    def bulk_favorite(self, request):
+        return self._bulk_change(request, Favorite, 'favorites_count')
+
+    @bulk_favorite.mapping.delete
+    def bulk_delete_favorite(self, request):
+        return self._bulk_change(request, Favorite, 'favorites_count')
+
+    @action(detail=False,
+            methods=['post'],
+            url_path='shopping_cart',
+            url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def bulk_shopping_cart(self, request):
+        return self._bulk_change(
+            request, ShoppingCart, 'in_carts_count', shopping_list=True)
+
+    @bulk_shopping_cart.mapping.delete
+    def bulk_delete_shopping_cart(self, request):
+        return self._bulk_change(
+            request, ShoppingCart, 'in_carts_count', shopping_list=True)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='download_shopping_cart',
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            renderer for renderer in SHOPPING_LIST_RENDERERS
+            if renderer.is_available()
+        ],
+    )
     def download_shopping_cart(self, request):
+        """
+        Список покупок в формате ?format=txt|csv|json (или по Accept).
+
+        Суммы по ингредиентам берутся из сводного списка пользователя
+        (ShoppingListItem) одним чтением по индексу, читаются курсором
+        и сразу пишутся в ответ, поэтому размер корзины не влияет на
+        память воркера. PDF рисуется в фоне: за ним отправляем на
+        download_shopping_cart/pdf/.
+        """
         user = request.user
+        renderer = request.accepted_renderer
+        if renderer.format == ShoppingListPDFRenderer.format:
+            return redirect('recipes-download-shopping-cart-pdf')
         if not user.shopping_cart.exists():
             return Response(
                 {'error': 'Список покупок пуст.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        ingredients = (
-            IngredientAmount.objects
-            .filter(recipe__shopping_cart__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
-            .order_by('ingredient__name')
+        items = (
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+            for name, unit, amount in self._shopping_list(user).iterator(
+                chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
         )
+        response = StreamingHttpResponse(
+            renderer.stream(items),
+            content_type=renderer.get_content_type(),
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"')
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='download_shopping_cart/pdf',
+        url_name='download-shopping-cart-pdf',
+        permission_classes=[IsAuthenticated],
+    )
+    def download_shopping_cart_pdf(self, request):
+        """
+        PDF списка покупок, который рисуется в пуле процессов.
+
+        Первый запрос ставит отрисовку в очередь и возвращает 202,
+        повторные (опрос) — 202, пока файл готовится, и сам файл, когда
+        он готов. Неизменный список отдаётся из готового файла сразу.
+        Если отрисовка или пул процессов отказали, ответ — 503, и
+        следующий запрос запускает отрисовку заново.
+        """
+        if not ShoppingListPDFRenderer.is_available():
+            raise Http404
+        user = request.user
+
+        @lru_cache(maxsize=1)
+        def load_items():
+            return [
+                {'name': name, 'measurement_unit': unit, 'amount': amount}
+                for name, unit, amount in self._shopping_list(user)
+            ]
 
-        shopping_list = []
-        for item in ingredients:
-            name = item['ingredient__name']
-            unit = item['ingredient__measurement_unit']
-            amount = item['total_amount']
-            shopping_list.append(f'• {name} — {amount} {unit}')
-
-        content = '\n'.join([
-            'Список покупок:',
-            '====================',
-            *shopping_list,
-        ])
-
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; ' \
-            'filename="shopping_list.txt"'
+        version = shopping_list_pdf.current_version(user.id, load_items)
+        if version is None:
+            return Response(
+                {'error': 'Список покупок пуст.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        state = shopping_list_pdf.status(user.id, version, load_items)
+        if state == READY:
+            try:
+                file = open(shopping_list_pdf.path(user.id, version), 'rb')
+            except FileNotFoundError:
+                # Файл успели заменить более новой версией списка.
+                state = PENDING
+            else:
+                response = FileResponse(
+                    file,
+                    as_attachment=True,
+                    filename='shopping_list.pdf',
+                    content_type=ShoppingListPDFRenderer.media_type,
+                )
+                response['X-Shopping-List-Version'] = version
+                return response
+        if state == FAILED:
+            response = Response(
+                {'status': FAILED,
+                 'error': 'Не удалось подготовить PDF, повторите запрос.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        else:
+            response = Response(
+                {'status': PENDING, 'version': version},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        response['Retry-After'] = settings.SHOPPING_LIST_PDF_RETRY_AFTER
         return response
 
+    @staticmethod
+    def _shopping_list(user):
+        """Позиции сводного списка: (название, единица, количество)."""
+        return (
+            ShoppingListItem.objects
+            .filter(user=user)
+            .values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'total_amount',
+            )
+            .order_by('ingredient__name')
+        )
+
 
 class UserViewSet(DjoserUserViewSet):
     """ViewSet для пользователей и подписок с оптимизацией под Djoser."""
     queryset = User.objects.all()
+    pagination_class = UserPagination
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия."""
@@ -265,6 +559,16 @@ class UserViewSet(DjoserUserViewSet):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
+    @staticmethod
+    def _follow_context(request):
+        """Контекст FollowSerializer с проверенным recipes_limit."""
+        params = RecipesLimitSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        context = {'request': request}
+        if 'recipes_limit' in params.validated_data:
+            context['recipes_limit'] = params.validated_data['recipes_limit']
+        return context
+
     def _get_author_or_400(self, id):
         """Возвращает автора или выбрасывает ошибку, если подписка на себя."""
         author = get_object_or_404(User, id=id)
@@ -281,7 +585,7 @@ class UserViewSet(DjoserUserViewSet):
         )
         serializer.is_valid(raise_exception=True)
         request.user.set_password(serializer.validated_data['new_password'])
-        request.user.save()
+        request.user.save(update_fields=['password'])
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -289,28 +593,32 @@ class UserViewSet(DjoserUserViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         """Вывод всех авторов, на которых подписан текущий пользователь."""
+        context = self._follow_context(request)
         follows = User.objects.filter(following__user=request.user)
         page = self.paginate_queryset(follows)
         if page is not None:
-            serializer = FollowSerializer(
-                page, many=True, context={'request': request})
+            serializer = FollowSerializer(page, many=True, context=context)
             return self.get_paginated_response(serializer.data)
 
-        serializer = FollowSerializer(
-            follows, many=True, context={'request': request})
+        serializer = FollowSerializer(follows, many=True, context=context)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'],
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id):
         """Подписка на автора."""
+        context = self._follow_context(request)
         author = self._get_author_or_400(id)
         if Follow.objects.filter(user=request.user, author=author).exists():
             return Response({'errors': 'Вы уже подписаны.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        Follow.objects.create(user=request.user, author=author)
-        serializer = FollowSerializer(author, context={'request': request})
+        with transaction.atomic():
+            Follow.objects.create(user=request.user, author=author)
+            change_counter(User, author.id, 'followers_count', 1)
+            follow_author(request.user.id, author.id)
+            bump_version(membership_version(request.user.id))
+        serializer = FollowSerializer(author, context=context)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -322,9 +630,18 @@ class UserViewSet(DjoserUserViewSet):
             return Response({'errors': 'Вы не подписаны на этого автора.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        follow.delete()
+        with transaction.atomic():
+            deleted, _ = follow.delete()
+            change_counter(User, author.id, 'followers_count', -deleted)
+            unfollow_author(request.user.id, author.id)
+            bump_version(membership_version(request.user.id))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def _touch_author_recipes(author):
+        """Меняет версию рецептов автора: в них встроены данные автора."""
+        Recipe.objects.filter(author=author).update(updated_at=timezone.now())
+
     @action(detail=False, methods=['put'],
             permission_classes=(IsAuthenticated,), url_path='me/avatar')
     def avatar(self, request):
@@ -339,6 +656,7 @@ class UserViewSet(DjoserUserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            self._touch_author_recipes(user)
 
             return Response(
                 {'avatar': request.build_absolute_uri(user.avatar.url)},
@@ -352,4 +670,5 @@ class UserViewSet(DjoserUserViewSet):
         """Удаление аватара пользователя."""
         if request.user:
             request.user.avatar.delete(save=True)
+            self._touch_author_recipes(request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -87,6 +87,28 @@ else:
         }
     }
 
+# Cache
+# Общий для всех процессов gunicorn кэш (Redis); без REDIS_URL —
+# кэш в памяти процесса, например для тестов и локальной разработки.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время жизни готовых ответов API для анонимных пользователей, секунды
+ANONYMOUS_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('ANONYMOUS_RESPONSE_CACHE_TIMEOUT', 600))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -119,11 +141,20 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10,
 }
@@ -147,3 +178,56 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Кэш общей части представления рецептов (в памяти процесса)
+RECIPE_FRAGMENT_CACHE_SIZE = int(
+    os.getenv('RECIPE_FRAGMENT_CACHE_SIZE', 5000))
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', 300))
+
+# Время жизни снимка пользователя по токену в кэше, секунды
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
+# Время жизни кэша id избранного, корзины и подписок пользователя, секунды.
+# Записи через API меняют версию сразу, срок ограничивает остальные.
+MEMBERSHIP_SETS_CACHE_TIMEOUT = int(
+    os.getenv('MEMBERSHIP_SETS_CACHE_TIMEOUT', 3600))
+
+# Сколько последних рецептов автора выводить в подписках: по умолчанию
+# и максимум для ?recipes_limit=
+SUBSCRIPTION_RECIPES_LIMIT = int(os.getenv('SUBSCRIPTION_RECIPES_LIMIT', 50))
+
+# Лента подписок: длина ленты пользователя и число подписчиков, после
+# которого рецепты автора не копируются в ленты, а подмешиваются при чтении.
+# Авторов через порог переводит команда rebuild_feeds --celebrities,
+# её нужно запускать по расписанию.
+FEED_TIMELINE_LENGTH = int(os.getenv('FEED_TIMELINE_LENGTH', 500))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 5000))
+
+# Максимум результатов автодополнения /api/ingredients/?name=
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+# Время кэширования снимка каталога ингредиентов: без версии в URL
+# и с версией (такой ответ никогда не меняется)
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', 3600))
+SNAPSHOT_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Выгрузка списка покупок: строк на одно чтение из курсора БД и
+# TTF-шрифт с кириллицей для PDF
+SHOPPING_LIST_CHUNK_SIZE = int(os.getenv('SHOPPING_LIST_CHUNK_SIZE', 2000))
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+# Фоновая отрисовка PDF списка покупок: процессы пула (0 — рисовать
+# прямо в запросе), каталог готовых файлов (вне MEDIA_ROOT: файлы
+# отдаются только владельцу), срок жизни отметки «в работе» и пауза
+# между опросами, которую советуем клиенту. Пул свой у каждого процесса
+# gunicorn: на хосте workers × SHOPPING_LIST_PDF_WORKERS процессов,
+# и каждый — копия процесса с загруженным Django.
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', 1))
+SHOPPING_LIST_EXPORT_DIR = os.getenv(
+    'SHOPPING_LIST_EXPORT_DIR', os.path.join(BASE_DIR, 'exports'))
+SHOPPING_LIST_PDF_TIMEOUT = int(os.getenv('SHOPPING_LIST_PDF_TIMEOUT', 60))
+SHOPPING_LIST_PDF_RETRY_AFTER = 1
@@ -9,7 +9,8 @@ User = get_user_model()
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     """Настройки админки для пользователей."""
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name',)
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count',)
     search_fields = ('username', 'email',)
     list_filter = ('username', 'email',)
     ordering = ('id',)
@@ -53,7 +54,7 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description='В избранном')
     def count_favorites(self, obj):
         """Количество добавлений рецепта в избранное."""
-        return obj.favorited_by.count()
+        return obj.favorites_count
 
 
 @admin.register(Favorite)
@@ -13,3 +13,4 @@ MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 10000
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 44640
+MAX_BULK_RECIPES = 100
@@ -0,0 +1,72 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Follow, Recipe, ShoppingCart, User
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик одним UPDATE, не опуская его ниже нуля."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Изменяет счётчик у нескольких строк одним UPDATE."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
+
+
+def _actual_count(source, fk):
+    return Coalesce(
+        Subquery(
+            source.objects.filter(**{fk: OuterRef('pk')})
+            .order_by()
+            .values(fk)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def recount_counters(batch_size=10000, dry_run=False):
+    """
+    Сверяет счётчики с исходными таблицами и исправляет расхождения.
+
+    Строки обрабатываются диапазонами первичного ключа по batch_size,
+    чтобы не держать блокировки на всей таблице. Возвращает словарь
+    {'Модель.поле': количество исправленных (найденных) строк}.
+    """
+    result = {}
+    for model, field, source, fk in COUNTERS:
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            drifted = (
+                model.objects.filter(pk__in=pks)
+                .annotate(actual=_actual_count(source, fk))
+                .exclude(**{field: F('actual')})
+                .values_list('pk', flat=True)
+            )
+            if dry_run:
+                fixed += drifted.count()
+            else:
+                fixed += model.objects.filter(pk__in=list(drifted)).update(
+                    **{field: _actual_count(source, fk)})
+        result[f'{model.__name__}.{field}'] = fixed
+    return result
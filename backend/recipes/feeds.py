@@ -0,0 +1,353 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q
+
+from .models import Follow, Recipe, TimelineEntry, User
+
+
+def _tables():
+    return {
+        'timeline': connection.ops.quote_name(TimelineEntry._meta.db_table),
+        'follow': connection.ops.quote_name(Follow._meta.db_table),
+        'recipe': connection.ops.quote_name(Recipe._meta.db_table),
+        'user': connection.ops.quote_name(User._meta.db_table),
+    }
+
+
+def _is_celebrity(author_id):
+    # Читается после UPDATE счётчика автора в той же транзакции: строка
+    # автора заблокирована, и sync_celebrities не переключит флаг, пока
+    # подписка или публикация не завершится.
+    return User.objects.filter(pk=author_id).values_list(
+        'is_celebrity', flat=True).get()
+
+
+def _follow_range(follows):
+    """Условие на id подписок (low, high]; high=None — без верхней границы."""
+    if follows is None:
+        return '', []
+    low, high = follows
+    if high is None:
+        return 'AND follow.id > %s ', [low]
+    return 'AND follow.id > %s AND follow.id <= %s ', [low, high]
+
+
+def _trim_followers(author_id, follows=None):
+    """
+    Обрезает до FEED_TIMELINE_LENGTH ленты подписчиков автора (только
+    подписок из диапазона follows, если он задан).
+
+    Для каждой ленты граница ищется коррелированным подзапросом
+    LIMIT 1 OFFSET FEED_TIMELINE_LENGTH по индексу ленты
+    (user, -pub_date, -recipe): это чтение FEED_TIMELINE_LENGTH + 1
+    записей индекса без сортировки и обращения к строкам. Затем
+    одним DELETE удаляются только записи за границей. Всего это
+    FEED_FANOUT_LIMIT × (FEED_TIMELINE_LENGTH + 1) записей индекса
+    в худшем случае, без оконной функции, ранжирующей ленты целиком.
+    """
+    tables = _tables()
+    follow_range, range_params = _follow_range(follows)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tables["timeline"]} WHERE id IN ('
+            f'SELECT timeline.id FROM ('
+            f'SELECT follow.user_id, ('
+            f'SELECT probe.recipe_id FROM {tables["timeline"]} probe '
+            f'WHERE probe.user_id = follow.user_id '
+            f'ORDER BY probe.pub_date DESC, probe.recipe_id DESC '
+            f'LIMIT 1 OFFSET %s'
+            f') AS recipe_id '
+            f'FROM {tables["follow"]} follow '
+            f'WHERE follow.author_id = %s {follow_range}'
+            f') boundary '
+            f'JOIN {tables["timeline"]} edge '
+            f'ON edge.user_id = boundary.user_id '
+            f'AND edge.recipe_id = boundary.recipe_id '
+            f'JOIN {tables["timeline"]} timeline '
+            f'ON timeline.user_id = boundary.user_id '
+            f'AND timeline.pub_date <= edge.pub_date '
+            f'AND (timeline.pub_date < edge.pub_date '
+            f'OR timeline.recipe_id <= edge.recipe_id))',
+            [settings.FEED_TIMELINE_LENGTH, author_id, *range_params],
+        )
+
+
+def _copy_author_recipes(author_id, user_id=None, follows=None,
+                         recipes_after=None):
+    """
+    Копирует FEED_TIMELINE_LENGTH последних рецептов автора (с id больше
+    recipes_after, если он задан) в ленту подписчика user_id или, без
+    него, в ленты подписчиков из диапазона подписок follows. Возвращает
+    количество добавленных записей.
+    """
+    tables = _tables()
+    conditions, params = _follow_range(follows)
+    if user_id is not None:
+        conditions += 'AND follow.user_id = %s '
+        params.append(user_id)
+    recipes = 'AND id > %s ' if recipes_after is not None else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tables["timeline"]} '
+            f'(user_id, recipe_id, pub_date) '
+            f'SELECT follow.user_id, recipe.id, recipe.pub_date '
+            f'FROM {tables["follow"]} follow '
+            f'CROSS JOIN (SELECT id, pub_date FROM {tables["recipe"]} '
+            f'WHERE author_id = %s {recipes}'
+            f'ORDER BY pub_date DESC, id DESC '
+            f'LIMIT %s) recipe '
+            f'WHERE follow.author_id = %s {conditions}'
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [author_id,
+             *([recipes_after] if recipes_after is not None else []),
+             settings.FEED_TIMELINE_LENGTH, author_id, *params],
+        )
+        return cursor.rowcount
+
+
+def fan_out(recipe):
+    """
+    Добавляет новый рецепт в ленты подписчиков автора одним
+    INSERT ... SELECT по подпискам и сразу обрезает эти ленты
+    (стоимость обрезки — в _trim_followers).
+    """
+    if _is_celebrity(recipe.author_id):
+        return
+    tables = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tables["timeline"]} '
+            f'(user_id, recipe_id, pub_date) '
+            f'SELECT follow.user_id, recipe.id, recipe.pub_date '
+            f'FROM {tables["follow"]} follow '
+            f'JOIN {tables["recipe"]} recipe '
+            f'ON recipe.author_id = follow.author_id '
+            f'WHERE recipe.id = %s '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [recipe.id],
+        )
+    _trim_followers(recipe.author_id)
+
+
+def follow_author(user_id, author_id):
+    """
+    Переносит в ленту последние рецепты автора после подписки (счётчик
+    подписчиков уже увеличен). Переход автора через FEED_FANOUT_LIMIT
+    здесь не обрабатывается: это работа sync_celebrities.
+    """
+    if _is_celebrity(author_id):
+        return
+    _copy_author_recipes(author_id, user_id)
+    trim_timeline(user_id)
+
+
+def unfollow_author(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
+
+
+def _delete_author_copies(author_id, batch_size):
+    """Удаляет копии рецептов автора из лент пачками по batch_size."""
+    while True:
+        ids = list(
+            TimelineEntry.objects.filter(recipe__author_id=author_id)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        TimelineEntry.objects.filter(pk__in=ids).delete()
+
+
+def _promote(author_id, batch_size):
+    # Флаг переключается первым: рецепты автора сразу читаются при
+    # чтении ленты, а ещё не удалённые копии не дают повторов.
+    User.objects.filter(pk=author_id).update(is_celebrity=True)
+    _delete_author_copies(author_id, batch_size)
+
+
+def _demote(author_id, batch_size):
+    last_recipe = Recipe.objects.filter(author_id=author_id).aggregate(
+        last=Max('pk'))['last'] or 0
+    last_follow = 0
+    while True:
+        follow_ids = list(
+            Follow.objects.filter(author_id=author_id, pk__gt=last_follow)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not follow_ids:
+            break
+        follows = (last_follow, follow_ids[-1])
+        with transaction.atomic():
+            _copy_author_recipes(author_id, follows=follows)
+            _trim_followers(author_id, follows=follows)
+        last_follow = follow_ids[-1]
+
+    with transaction.atomic():
+        # Подписки и публикации меняют счётчики автора и блокируют его
+        # строку: после блокировки новых не появится до снятия флага.
+        followers_count = User.objects.select_for_update().filter(
+            pk=author_id).values_list('followers_count', flat=True).get()
+        if followers_count <= settings.FEED_FANOUT_LIMIT:
+            # Догоняем подписки и рецепты, появившиеся за время копирования.
+            copied = _copy_author_recipes(
+                author_id, follows=(last_follow, None))
+            copied += _copy_author_recipes(
+                author_id, recipes_after=last_recipe)
+            if copied:
+                _trim_followers(author_id)
+            User.objects.filter(pk=author_id).update(is_celebrity=False)
+            return
+    # Автор снова стал популярным, пока копировались рецепты.
+    _delete_author_copies(author_id, batch_size)
+
+
+def sync_celebrities(batch_size=1000):
+    """
+    Переводит авторов, чей счётчик подписчиков пересёк
+    FEED_FANOUT_LIMIT, между копированием рецептов в ленты и
+    подмешиванием при чтении. Возвращает количество переведённых.
+
+    Работа пропорциональна числу подписчиков автора, поэтому она
+    выполняется не в запросе подписки, а по расписанию (команда
+    rebuild_feeds --celebrities) пачками по batch_size в отдельных
+    транзакциях. До перевода лента остаётся верной: рецепты автора
+    читаются либо из копий, либо при чтении, а повторы отбрасываются.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    promoted = list(User.objects.filter(
+        is_celebrity=False, followers_count__gt=limit,
+    ).values_list('pk', flat=True))
+    demoted = list(User.objects.filter(
+        is_celebrity=True, followers_count__lte=limit,
+    ).values_list('pk', flat=True))
+    for author_id in promoted:
+        _promote(author_id, batch_size)
+    for author_id in demoted:
+        _demote(author_id, batch_size)
+    return len(promoted) + len(demoted)
+
+
+def trim_timeline(user_id):
+    """
+    Оставляет в ленте FEED_TIMELINE_LENGTH последних записей: граница
+    находится по индексу ленты, лишнее удаляется одним DELETE.
+    """
+    boundary = (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .order_by('-pub_date', '-recipe')
+        .values_list('pub_date', 'recipe')[
+            settings.FEED_TIMELINE_LENGTH:settings.FEED_TIMELINE_LENGTH + 1]
+    )
+    for pub_date, recipe_id in boundary:
+        TimelineEntry.objects.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lte=recipe_id),
+            user_id=user_id,
+        ).delete()
+
+
+def _after(values, reverse, id_field):
+    """Условие «после ключа (pub_date, id)» в порядке страницы ленты."""
+    pub_date, recipe_id = values
+    lookup = 'gt' if reverse else 'lt'
+    return Q(**{f'pub_date__{lookup}e': pub_date}) & (
+        Q(**{f'pub_date__{lookup}': pub_date})
+        | Q(pub_date=pub_date, **{f'{id_field}__{lookup}': recipe_id})
+    )
+
+
+def feed_page_ids(user, limit, after=None, reverse=False):
+    """
+    id рецептов страницы ленты в порядке (-pub_date, -id), обратном
+    при reverse, начиная после ключа after.
+
+    Страница собирается из limit записей ленты, прочитанных по индексу
+    (user, -pub_date, -recipe), и не больше limit последних рецептов
+    каждого популярного автора из подписок (по индексу
+    (author, -pub_date)): всё одним UNION. UNION, а не UNION ALL:
+    пока sync_celebrities переводит автора, его рецепты есть и в ленте,
+    и среди подмешиваемых.
+    """
+    direction = '' if reverse else '-'
+    parts = [
+        TimelineEntry.objects.filter(user=user),
+        *(
+            Recipe.objects.filter(author_id=author_id)
+            for author_id in Follow.objects.filter(
+                user=user, author__is_celebrity=True,
+            ).values_list('author', flat=True)
+        ),
+    ]
+    sqls, params = [], []
+    for number, queryset in enumerate(parts):
+        id_field = 'recipe_id' if queryset.model is TimelineEntry else 'id'
+        if after is not None:
+            queryset = queryset.filter(_after(after, reverse, id_field))
+        sql, part_params = (
+            queryset.order_by(f'{direction}pub_date', f'{direction}{id_field}')
+            .values_list('pub_date', id_field)[:limit]
+            .query.sql_with_params()
+        )
+        # Срезы внутри UNION приходится оборачивать в подзапросы.
+        sqls.append(f'SELECT * FROM ({sql}) part{number}')
+        params.extend(part_params)
+    order = 'ASC' if reverse else 'DESC'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT recipe_id FROM ({" UNION ".join(sqls)}) feed '
+            f'ORDER BY pub_date {order}, recipe_id {order} LIMIT %s',
+            [*params, limit],
+        )
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+def rebuild_timelines(batch_size=1000):
+    """
+    Пересобирает ленты всех пользователей из подписок: по
+    FEED_TIMELINE_LENGTH последних рецептов авторов, кроме популярных.
+
+    Пользователи обрабатываются диапазонами первичного ключа по
+    batch_size. Возвращает количество записей в лентах. Флаги
+    популярности выставляются по счётчикам заново, поэтому пересборка
+    нужна и после recount_counters.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    User.objects.filter(followers_count__gt=limit).update(is_celebrity=True)
+    User.objects.filter(followers_count__lte=limit).update(is_celebrity=False)
+    tables = _tables()
+    total = 0
+    last_pk = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            break
+        last_pk = user_ids[-1]
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            TimelineEntry.objects.filter(user__in=user_ids).delete()
+            cursor.execute(
+                f'INSERT INTO {tables["timeline"]} '
+                f'(user_id, recipe_id, pub_date) '
+                f'SELECT user_id, recipe_id, pub_date FROM ('
+                f'SELECT follow.user_id, recipe.id AS recipe_id, '
+                f'recipe.pub_date, ROW_NUMBER() OVER ('
+                f'PARTITION BY follow.user_id '
+                f'ORDER BY recipe.pub_date DESC, recipe.id DESC) AS position '
+                f'FROM {tables["follow"]} follow '
+                f'JOIN {tables["user"]} author '
+                f'ON author.id = follow.author_id '
+                f'JOIN {tables["recipe"]} recipe '
+                f'ON recipe.author_id = follow.author_id '
+                f'WHERE follow.user_id IN ({placeholders}) '
+                f'AND author.is_celebrity = %s'
+                f') ranked WHERE position <= %s',
+                [*user_ids, False, settings.FEED_TIMELINE_LENGTH],
+            )
+            total += cursor.rowcount
+    return total
@@ -0,0 +1,219 @@
+import csv
+import io
+import json
+import time
+
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from .signals import bulk_changed
+
+
+def read_rows(path, fields, delimiter=','):
+    """
+    Построчно читает записи из CSV, JSON или JSON Lines.
+
+    Формат определяется по расширению: .json — массив объектов (читается
+    целиком), .jsonl/.ndjson — по объекту в строке, остальное — CSV с
+    заголовком или без него (тогда колонки идут в порядке fields).
+    Возвращает генератор словарей.
+    """
+    suffix = Path(path).suffix.lower()
+    with open(path, encoding='utf-8') as file:
+        if suffix == '.json':
+            yield from json.load(file)
+        elif suffix in ('.jsonl', '.ndjson'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            # Определяем, есть ли заголовки
+            has_header = csv.Sniffer().has_header(file.read(1024))
+            file.seek(0)
+            yield from csv.DictReader(
+                file,
+                fieldnames=None if has_header else fields,
+                delimiter=delimiter,
+            )
+
+
+class BulkImporter:
+    """
+    Потоковый импорт строк пачками в отдельных транзакциях.
+
+    Пачка пишется одним bulk_create(ignore_conflicts=True), а в PostgreSQL —
+    через COPY во временную таблицу и INSERT ... ON CONFLICT DO NOTHING.
+    Уже существующие записи пропускаются, поэтому импорт можно повторять.
+    """
+
+    def __init__(self, model, fields, batch_size=5000, dry_run=False,
+                 use_copy=True, normalize=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.max_lengths = {
+            field: model._meta.get_field(field).max_length
+            for field in self.fields
+        }
+
+    def clean(self, row):
+        """Значения полей строки или None, если строка некорректна."""
+        values = {}
+        for field in self.fields:
+            value = str(row.get(field) or '').strip()
+            max_length = self.max_lengths[field]
+            if not value or (max_length and len(value) > max_length):
+                return None
+            values[field] = value
+        return self.normalize(values) if self.normalize else values
+
+    def run(self, rows, progress=None):
+        """
+        Импортирует строки; progress(обработано, пропущено, секунд)
+        вызывается после каждой пачки. Возвращает словарь со статистикой.
+        """
+        started = time.monotonic()
+        before = self.model.objects.count()
+        processed = skipped = 0
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            cleaned = [values for values in map(self.clean, batch) if values]
+            processed += len(cleaned)
+            skipped += len(batch) - len(cleaned)
+            if cleaned and not self.dry_run:
+                with transaction.atomic():
+                    self.write(cleaned)
+            if progress:
+                progress(processed, skipped, time.monotonic() - started)
+        created = 0
+        if not self.dry_run:
+            created = self.model.objects.count() - before
+            if created:
+                bulk_changed.send(sender=self.model)
+        return {
+            'processed': processed,
+            'skipped': skipped,
+            'created': created,
+            'seconds': time.monotonic() - started,
+        }
+
+    def write(self, batch):
+        if self.use_copy:
+            with connection.cursor() as cursor:
+                if hasattr(cursor, 'copy_expert'):
+                    self._copy(cursor, batch)
+                    return
+        self.model.objects.bulk_create(
+            (self.model(**values) for values in batch),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def _copy(self, cursor, batch):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        temp_table = connection.ops.quote_name(
+            f'import_{self.model._meta.db_table}')
+        columns = ', '.join(
+            connection.ops.quote_name(self.model._meta.get_field(field).column)
+            for field in self.fields
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([values[field] for field in self.fields]
+                         for values in batch)
+        buffer.seek(0)
+        # Вложенная транзакция (например, в тестах) не удаляет таблицу
+        # при выходе, поэтому удаляем её явно.
+        cursor.execute(f'DROP TABLE IF EXISTS {temp_table}')
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {temp_table} ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA')
+        cursor.copy_expert(
+            f'COPY {temp_table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT {columns} FROM {temp_table} ON CONFLICT DO NOTHING')
+
+
+class BaseImportCommand(BaseCommand):
+    """Общая основа команд импорта справочников из файлов."""
+    model = None
+    fields = ()
+    verbose_name_plural = ''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            type=str,
+            help='Путь к файлу CSV, JSON или JSON Lines'
+        )
+        parser.add_argument(
+            '--delimiter',
+            type=str,
+            default=',',
+            help='Разделитель полей в CSV (по умолчанию: ",")'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке (по умолчанию: 5000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только прочитать и проверить файл, ничего не записывая'
+        )
+
+    def get_importer(self, **kwargs):
+        return BulkImporter(
+            self.model,
+            self.fields,
+            batch_size=kwargs['batch_size'],
+            dry_run=kwargs['dry_run'],
+            normalize=self.normalize,
+        )
+
+    def normalize(self, values):
+        """Приводит значения строки к виду, в котором они хранятся."""
+        return values
+
+    def progress(self, processed, skipped, seconds):
+        rate = processed / seconds if seconds else processed
+        self.stdout.write(
+            f'Обработано {processed}, пропущено {skipped} '
+            f'({rate:.0f} строк/с)')
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['file']
+        importer = self.get_importer(**kwargs)
+        try:
+            result = importer.run(
+                read_rows(path, self.fields, kwargs['delimiter']),
+                progress=self.progress,
+            )
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'Файл не найден: {path}'))
+            return
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Ошибка: {str(e)}'))
+            return
+
+        if kwargs['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Проверено {result["processed"]} {self.verbose_name_plural}'
+                f', некорректных строк: {result["skipped"]}'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Успешно загружено {result["created"]} '
+            f'{self.verbose_name_plural} за {result["seconds"]:.2f} с '
+            f'(обработано {result["processed"]}, '
+            f'пропущено {result["skipped"]})!'))
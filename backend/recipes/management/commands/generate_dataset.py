@@ -0,0 +1,281 @@
+import random
+import time
+
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.counters import recount_counters
+from recipes.feeds import rebuild_timelines
+from recipes.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    User,
+)
+from recipes.shopping_lists import reconcile_shopping_lists
+from recipes.signals import bulk_changed
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+class ZipfSampler:
+    """
+    Выборка с распределением Ципфа: элемент ранга r выпадает
+    пропорционально 1 / r ** s. Ранги раздаются в случайном порядке,
+    чтобы популярность не совпадала с порядком id.
+    """
+
+    def __init__(self, items, s, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** s for rank in range(1, len(self.items) + 1)))
+        self.rng = rng
+
+    def sample(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def sample_unique(self, k):
+        """k различных элементов; популярные по-прежнему чаще."""
+        k = min(k, len(self.items))
+        if k > len(self.items) // 2:
+            return self.rng.sample(self.items, k)
+        result = set()
+        while len(result) < k:
+            result.update(self.sample(k - len(result)))
+        return list(result)
+
+
+class Command(BaseCommand):
+    help = ('Заполнение БД синтетическими пользователями, рецептами, '
+            'избранным, корзинами и подписками для нагрузочных тестов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей (по умолчанию: 1000)')
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Количество рецептов (по умолчанию: 10000)')
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Размер каталога ингредиентов, если он пуст '
+                 '(по умолчанию: 2000)')
+        parser.add_argument(
+            '--tags', type=int, default=10,
+            help='Минимальное количество тегов (по умолчанию: 10)')
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном у пользователя '
+                 '(по умолчанию: 20)')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в списке покупок '
+                 '(по умолчанию: 5)')
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок пользователя (по умолчанию: 10)')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней разбросать даты публикации '
+                 'рецептов (по умолчанию: 365)')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа (по умолчанию: 1.1)')
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Зерно генератора случайных чисел (по умолчанию: 1)')
+        parser.add_argument(
+            '--prefix', type=str, default='user',
+            help='Префикс логинов и почт пользователей '
+                 '(по умолчанию: "user")')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одной пачке (по умолчанию: 5000)')
+
+    def handle(self, *args, **kwargs):
+        self.rng = random.Random(kwargs['seed'])
+        self.zipf = kwargs['zipf']
+        self.batch_size = kwargs['batch_size']
+        prefix = kwargs['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом «{prefix}» уже есть, '
+                'укажите другой --prefix.')
+        if kwargs['users'] < 2 or kwargs['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+
+        tag_ids = self.ensure_tags(kwargs['tags'])
+        ingredient_ids = self.ensure_ingredients(kwargs['ingredients'])
+        user_ids = self.create_users(kwargs['users'], prefix)
+        recipe_ids = self.create_recipes(
+            kwargs['recipes'], user_ids, kwargs['days'])
+        self.create_recipe_relations(recipe_ids, tag_ids, ingredient_ids)
+        self.create_memberships(Favorite, user_ids, recipe_ids,
+                                kwargs['favorites'])
+        self.create_memberships(ShoppingCart, user_ids, recipe_ids,
+                                kwargs['carts'])
+        self.create_follows(user_ids, kwargs['follows'])
+
+        started = time.monotonic()
+        recount_counters(batch_size=self.batch_size)
+        self.report('Счётчики пересчитаны', None, started)
+        started = time.monotonic()
+        reconcile_shopping_lists(batch_size=self.batch_size)
+        self.report('Списки покупок собраны', None, started)
+        started = time.monotonic()
+        self.report('Ленты подписок собраны',
+                    rebuild_timelines(batch_size=self.batch_size), started)
+        for model in (Tag, Ingredient, User, Recipe,
+                      Favorite, ShoppingCart, Follow):
+            bulk_changed.send(sender=model)
+        self.stdout.write(self.style.SUCCESS('Готово!'))
+
+    def report(self, title, count, started):
+        seconds = time.monotonic() - started
+        rows = f': {count} строк' if count is not None else ''
+        self.stdout.write(f'{title}{rows} за {seconds:.1f} с')
+
+    def bulk_create(self, model, objects, return_ids=False, after=None):
+        """
+        Записывает объекты пачками. Возвращает список id созданных
+        объектов или, для больших таблиц связей, только их количество.
+        after(batch) вызывается в транзакции пачки сразу после вставки.
+        """
+        ids = []
+        count = 0
+        objects = iter(objects)
+        while batch := list(islice(objects, self.batch_size)):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+                if after is not None:
+                    after(batch)
+            count += len(batch)
+            if return_ids:
+                ids.extend(obj.pk for obj in batch)
+        return ids if return_ids else count
+
+    def activity(self, average, limit):
+        """Число действий пользователя: тяжёлый хвост со средним average."""
+        # Среднее paretovariate(1.5) равно 3.
+        return min(int(average * self.rng.paretovariate(1.5) / 3), limit)
+
+    def ensure_tags(self, count):
+        started = time.monotonic()
+        existing = Tag.objects.count()
+        self.bulk_create(Tag, (
+            Tag(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(existing + 1, count + 1)
+        ))
+        self.report('Теги', max(count - existing, 0), started)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def ensure_ingredients(self, count):
+        started = time.monotonic()
+        if not Ingredient.objects.exists():
+            self.bulk_create(Ingredient, (
+                Ingredient(name=f'Ингредиент {number}',
+                           measurement_unit=UNITS[number % len(UNITS)])
+                for number in range(1, count + 1)
+            ))
+            self.report('Ингредиенты', count, started)
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count, prefix):
+        started = time.monotonic()
+        # Хэш пароля считается один раз: он дорогой намеренно.
+        password = make_password(f'{prefix}-password')
+        user_ids = self.bulk_create(User, (
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(1, count + 1)
+        ), return_ids=True)
+        self.report('Пользователи', len(user_ids), started)
+        return user_ids
+
+    def create_recipes(self, count, user_ids, days):
+        started = time.monotonic()
+        authors = ZipfSampler(user_ids, self.zipf, self.rng)
+        now = timezone.now()
+
+        def spread_dates(batch):
+            # auto_now_add ставит всем рецептам время вставки, и лента,
+            # пагинация и индексы по pub_date работали бы на одной дате.
+            # bulk_update даты не перезаписывает.
+            for recipe in batch:
+                recipe.pub_date = recipe.updated_at = now - timedelta(
+                    seconds=self.rng.uniform(0, days * 24 * 60 * 60))
+            Recipe.objects.bulk_update(batch, ('pub_date', 'updated_at'))
+
+        recipe_ids = self.bulk_create(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=f'Рецепт {number}',
+                text='Синтетический рецепт для нагрузочного теста.',
+                cooking_time=self.rng.randint(5, 180),
+                image='recipes/generated.png',
+            )
+            for number, author_id in enumerate(
+                authors.sample(count), start=1)
+        ), return_ids=True, after=spread_dates)
+        self.report('Рецепты', len(recipe_ids), started)
+        return recipe_ids
+
+    def create_recipe_relations(self, recipe_ids, tag_ids, ingredient_ids):
+        started = time.monotonic()
+        tags = ZipfSampler(tag_ids, self.zipf, self.rng)
+        created = self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in tags.sample_unique(self.rng.randint(1, 3))
+        ))
+        self.report('Теги рецептов', created, started)
+
+        started = time.monotonic()
+        ingredients = ZipfSampler(ingredient_ids, self.zipf, self.rng)
+        created = self.bulk_create(IngredientAmount, (
+            IngredientAmount(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=self.rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredients.sample_unique(
+                self.rng.randint(3, 12))
+        ))
+        self.report('Ингредиенты рецептов', created, started)
+
+    def create_memberships(self, model, user_ids, recipe_ids, average):
+        started = time.monotonic()
+        recipes = ZipfSampler(recipe_ids, self.zipf, self.rng)
+        created = self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.sample_unique(
+                self.activity(average, len(recipe_ids)))
+        ))
+        self.report(model._meta.verbose_name_plural, created, started)
+
+    def create_follows(self, user_ids, average):
+        started = time.monotonic()
+        authors = ZipfSampler(user_ids, self.zipf, self.rng)
+        created = self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in authors.sample_unique(
+                self.activity(average, len(user_ids) - 1) + 1)
+            if author_id != user_id
+        ))
+        self.report('Подписки', created, started)
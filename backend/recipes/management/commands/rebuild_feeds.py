@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feeds import rebuild_timelines, sync_celebrities
+
+
+class Command(BaseCommand):
+    help = ('Пересборка лент подписок пользователей из подписок '
+            'и рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей в одной пачке (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--celebrities',
+            action='store_true',
+            help='Только перевести авторов, пересёкших FEED_FANOUT_LIMIT, '
+                 'без пересборки лент (для запуска по расписанию)'
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['celebrities']:
+            switched = sync_celebrities(batch_size=kwargs['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Переведено авторов: {switched}'))
+            return
+        total = rebuild_timelines(batch_size=kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {total}'))
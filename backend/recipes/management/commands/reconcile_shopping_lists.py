@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.shopping_lists import reconcile_shopping_lists
+
+
+class Command(BaseCommand):
+    help = ('Сверка сводных списков покупок с корзинами и составом '
+            'рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей в одной пачке (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя'
+        )
+
+    def handle(self, *args, **kwargs):
+        dry_run = kwargs['dry_run']
+        fixed = reconcile_shopping_lists(
+            batch_size=kwargs['batch_size'], dry_run=dry_run)
+
+        action = 'Найдено расхождений' if dry_run else 'Исправлено списков'
+        self.stdout.write(self.style.SUCCESS(f'{action}: {fixed}'))
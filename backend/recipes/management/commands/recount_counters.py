@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт денормализованных счётчиков избранного, корзин, '
+            'рецептов и подписчиков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Количество строк в одной пачке (по умолчанию: 10000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя'
+        )
+
+    def handle(self, *args, **kwargs):
+        dry_run = kwargs['dry_run']
+        result = recount_counters(
+            batch_size=kwargs['batch_size'], dry_run=dry_run)
+
+        action = 'Найдено расхождений' if dry_run else 'Исправлено'
+        for counter, count in result.items():
+            self.stdout.write(f'{counter}: {action.lower()} {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}: {sum(result.values())}'))
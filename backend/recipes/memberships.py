@@ -0,0 +1,116 @@
+from django.db import connection
+
+from .counters import change_counter
+from .models import Recipe
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+def add_memberships(model, user_id, recipe_ids):
+    """
+    Добавляет рецепты в избранное или корзину (model) пользователя.
+
+    Существующие рецепты вставляются одним
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, поэтому уже
+    добавленные пропускаются без ошибок и гонок. Возвращает пару
+    множеств: (добавленные id, id существующих рецептов).
+    """
+    found = set(
+        Recipe.objects.filter(pk__in=recipe_ids)
+        .values_list('pk', flat=True))
+    if not found:
+        return set(), found
+    table = connection.ops.quote_name(model._meta.db_table)
+    values = ', '.join(['(%s, %s)'] * len(found))
+    params = [value for recipe_id in sorted(found)
+              for value in (user_id, recipe_id)]
+    created = _execute(
+        f'INSERT INTO {table} (user_id, recipe_id) VALUES {values} '
+        f'ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING recipe_id',
+        params,
+    )
+    return created, found
+
+
+def _delete_memberships(model, user_id, recipe_ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    return _execute(
+        f'DELETE FROM {table} WHERE user_id = %s '
+        f'AND recipe_id IN ({placeholders}) RETURNING recipe_id',
+        [user_id, *recipe_ids],
+    )
+
+
+def remove_memberships(model, user_id, recipe_ids):
+    """
+    Убирает рецепты из избранного или корзины (model) пользователя
+    одним DELETE ... RETURNING. Возвращает пару множеств: (удалённые
+    id, id существующих рецептов); существование проверяется отдельным
+    запросом, только если удалено не всё.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return set(), set()
+    removed = _delete_memberships(model, user_id, recipe_ids)
+    found = set(removed)
+    rest = set(recipe_ids) - removed
+    if rest:
+        found.update(
+            Recipe.objects.filter(pk__in=rest).values_list('pk', flat=True))
+    return removed, found
+
+
+def add_membership(model, user_id, recipe_id, counter_field, fields):
+    """
+    Добавляет рецепт в избранное или корзину (model) пользователя.
+
+    Вставка — один INSERT ... SELECT ... ON CONFLICT DO NOTHING, так что
+    повторное и одновременное добавление не приводит к IntegrityError.
+    Если строка добавлена, счётчик рецепта увеличивается UPDATE ...
+    RETURNING, который заодно возвращает поля fields для ответа.
+    Возвращает рецепт с этими полями или None, если рецепт уже добавлен
+    или не существует.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    recipes = connection.ops.quote_name(Recipe._meta.db_table)
+    created = _execute(
+        f'INSERT INTO {table} (user_id, recipe_id) '
+        f'SELECT %s, id FROM {recipes} WHERE id = %s '
+        f'ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING recipe_id',
+        [user_id, recipe_id],
+    )
+    if not created:
+        return None
+    counter = connection.ops.quote_name(
+        Recipe._meta.get_field(counter_field).column)
+    # from_db ждёт значения в порядке полей модели.
+    returned = [field for field in Recipe._meta.concrete_fields
+                if field.name in fields]
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in returned)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {recipes} SET {counter} = {counter} + 1 WHERE id = %s '
+            f'RETURNING {columns}',
+            [recipe_id],
+        )
+        values = cursor.fetchone()
+    return Recipe.from_db(
+        connection.alias, [field.attname for field in returned], values)
+
+
+def remove_membership(model, user_id, recipe_id, counter_field):
+    """
+    Убирает рецепт из избранного или корзины (model) пользователя одним
+    DELETE и уменьшает счётчик рецепта. Возвращает True, если рецепт
+    там был.
+    """
+    if not _delete_memberships(model, user_id, [recipe_id]):
+        return False
+    change_counter(Recipe, recipe_id, counter_field, -1)
+    return True
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    counters = (
+        ('Recipe', 'favorites_count', 'Favorite', 'recipe'),
+        ('Recipe', 'in_carts_count', 'ShoppingCart', 'recipe'),
+        ('User', 'recipes_count', 'Recipe', 'author'),
+        ('User', 'followers_count', 'Follow', 'author'),
+    )
+    for model_name, field, source_name, fk in counters:
+        model = apps.get_model('recipes', model_name)
+        source = apps.get_model('recipes', source_name)
+        model.objects.update(**{field: Coalesce(
+            Subquery(
+                source.objects.filter(**{fk: OuterRef('pk')})
+                .order_by()
+                .values(fk)
+                .annotate(count=Count('pk'))
+                .values('count')
+            ),
+            0,
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс (tag_id, recipe_id) для автоматической таблицы связи рецептов и
+    тегов: позволяет выбрать рецепты по тегам сканированием только индекса.
+    """
+
+    dependencies = [
+        ('recipes', '0005_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=('CREATE INDEX recipe_tags_tag_recipe_idx '
+                 'ON recipes_recipe_tags (tag_id, recipe_id);'),
+            reverse_sql='DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Django строит istartswith/icontains в PostgreSQL как
+# UPPER("name"::text) LIKE UPPER(%s), поэтому индексы построены по тому же
+# выражению: text_pattern_ops — для поиска по префиксу, pg_trgm — по подстроке.
+FORWARD_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_pattern_idx '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops);',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_trgm_idx '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops);',
+)
+REVERSE_SQL = (
+    'DROP INDEX IF EXISTS ingredient_name_upper_trgm_idx;',
+    'DROP INDEX IF EXISTS ingredient_name_upper_pattern_idx;',
+)
+
+
+def _run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    Индексы для поиска ингредиентов по названию.
+
+    Операторные классы text_pattern_ops и gin_trgm_ops есть только в
+    PostgreSQL, на остальных СУБД миграция ничего не делает.
+    """
+
+    dependencies = [
+        ('recipes', '0007_recipe_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run_on_postgresql(FORWARD_SQL),
+            _run_on_postgresql(REVERSE_SQL),
+        ),
+    ]
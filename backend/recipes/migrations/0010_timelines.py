@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timelines(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    timeline, follow, recipe, user = (
+        quote(apps.get_model(*name.split('.'))._meta.db_table)
+        for name in ('recipes.TimelineEntry', 'recipes.Follow',
+                     'recipes.Recipe', 'recipes.User')
+    )
+    schema_editor.execute(
+        f'INSERT INTO {timeline} (user_id, recipe_id, pub_date) '
+        f'SELECT user_id, recipe_id, pub_date FROM ('
+        f'SELECT follow.user_id, recipe.id AS recipe_id, recipe.pub_date, '
+        f'ROW_NUMBER() OVER (PARTITION BY follow.user_id '
+        f'ORDER BY recipe.pub_date DESC, recipe.id DESC) AS position '
+        f'FROM {follow} follow '
+        f'JOIN {user} author ON author.id = follow.author_id '
+        f'JOIN {recipe} recipe ON recipe.author_id = follow.author_id '
+        f'WHERE author.followers_count <= %s'
+        f') ranked WHERE position <= %s',
+        [settings.FEED_FANOUT_LIMIT, settings.FEED_TIMELINE_LENGTH],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_shopping_list_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+                'indexes': [models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_user_pub_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'recipe'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
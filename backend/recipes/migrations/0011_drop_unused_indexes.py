@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Поиск ингредиентов по префиксу обслуживается индексом в памяти
+# (api.search), поэтому text_pattern_ops-индекс из 0008 не используется.
+# GIN-индекс pg_trgm остаётся: по нему идёт нечёткий поиск.
+DROP_PATTERN_INDEX = (
+    'DROP INDEX IF EXISTS ingredient_name_upper_pattern_idx;'
+)
+CREATE_PATTERN_INDEX = (
+    'CREATE INDEX IF NOT EXISTS ingredient_name_upper_pattern_idx '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops);'
+)
+
+
+def _run_on_postgresql(statement):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_timelines'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='favorite',
+            name='favorite_recipe_user_idx',
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.RunPython(
+            _run_on_postgresql(DROP_PATTERN_INDEX),
+            _run_on_postgresql(CREATE_PATTERN_INDEX),
+        ),
+    ]
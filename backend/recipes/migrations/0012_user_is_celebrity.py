@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    # До этой миграции популярность считалась по счётчику на лету,
+    # и рецептов таких авторов в лентах уже нет.
+    User = apps.get_model('recipes', 'User')
+    User.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).update(is_celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_drop_unused_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_celebrity',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Популярный автор'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
@@ -46,6 +46,24 @@ class User(AbstractUser):
         null=True,
         verbose_name='Аватар'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
+    # Рецепты автора не копируются в ленты подписчиков, а подмешиваются
+    # при чтении. Переключается recipes.feeds.sync_celebrities, когда
+    # followers_count пересекает FEED_FANOUT_LIMIT.
+    is_celebrity = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Популярный автор',
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -170,12 +188,36 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -247,9 +289,12 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь'
     )
+    # Отдельный индекс по recipe не нужен: его покрывает индекс
+    # (recipe, user), по которому пересчитываются списки покупок.
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Рецепт'
     )
 
@@ -263,6 +308,99 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'),
+                name='shopping_cart_recipe_user_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Сумма ингредиента по всем рецептам в списке покупок пользователя.
+
+    Поддерживается инкрементально (recipes.shopping_lists), сверяется
+    с ShoppingCart и IngredientAmount командой reconcile_shopping_lists.
+    """
+    # Отдельный индекс по user не нужен: его покрывает уникальный
+    # индекс (user, ingredient).
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        db_index=False,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.total_amount}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписок пользователя.
+
+    Заполняется при публикации рецепта (fan-out on write) и обрезается
+    до FEED_TIMELINE_LENGTH записей, см. recipes.feeds.
+    """
+    # Отдельный индекс по user не нужен: его покрывают уникальный
+    # индекс (user, recipe) и индекс ленты (user, -pub_date, -recipe).
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        db_index=False,
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.recipe}'
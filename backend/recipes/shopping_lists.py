@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import IngredientAmount, ShoppingCart, ShoppingListItem, User
+
+
+def change_shopping_lists(recipe_ids, sign, user_id=None):
+    """
+    Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+    в сводных списках покупок.
+
+    С user_id меняется список одного пользователя (рецепты добавляют в
+    корзину или убирают из неё), без него — списки всех, у кого рецепт
+    в корзине (меняется состав рецепта). Всё делает один
+    INSERT ... ON CONFLICT DO UPDATE, опустевшие позиции удаляются.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    table = connection.ops.quote_name(ShoppingListItem._meta.db_table)
+    amounts = connection.ops.quote_name(IngredientAmount._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    # Один ингредиент может встречаться в нескольких рецептах, а
+    # ON CONFLICT DO UPDATE не может менять строку дважды: суммируем.
+    if user_id is None:
+        carts = connection.ops.quote_name(ShoppingCart._meta.db_table)
+        source = (
+            f'SELECT cart.user_id, amount.ingredient_id, '
+            f'SUM(amount.amount) * %s '
+            f'FROM {amounts} amount '
+            f'JOIN {carts} cart ON cart.recipe_id = amount.recipe_id '
+            f'WHERE amount.recipe_id IN ({placeholders}) '
+            f'GROUP BY cart.user_id, amount.ingredient_id'
+        )
+        params = [sign, *recipe_ids]
+    else:
+        source = (
+            f'SELECT %s, amount.ingredient_id, SUM(amount.amount) * %s '
+            f'FROM {amounts} amount '
+            f'WHERE amount.recipe_id IN ({placeholders}) '
+            f'GROUP BY amount.ingredient_id'
+        )
+        params = [user_id, sign, *recipe_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, ingredient_id, total_amount) '
+            f'{source} '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+            f'SET total_amount = {table}.total_amount '
+            f'+ EXCLUDED.total_amount',
+            params,
+        )
+    if sign < 0:
+        emptied = ShoppingListItem.objects.filter(
+            total_amount__lte=0,
+            ingredient__in=IngredientAmount.objects.filter(
+                recipe_id__in=recipe_ids).values('ingredient'),
+        )
+        if user_id is not None:
+            emptied = emptied.filter(user_id=user_id)
+        emptied.delete()
+
+
+def _actual_lists(user_ids):
+    lists = defaultdict(dict)
+    totals = (
+        IngredientAmount.objects
+        .filter(recipe__shopping_cart__user__in=user_ids)
+        .values_list('recipe__shopping_cart__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for user_id, ingredient_id, total in totals:
+        lists[user_id][ingredient_id] = total
+    return lists
+
+
+def _stored_lists(user_ids):
+    lists = defaultdict(dict)
+    items = ShoppingListItem.objects.filter(user__in=user_ids).values_list(
+        'user', 'ingredient', 'total_amount')
+    for user_id, ingredient_id, total in items:
+        lists[user_id][ingredient_id] = total
+    return lists
+
+
+def reconcile_shopping_lists(batch_size=1000, dry_run=False):
+    """
+    Сверяет сводные списки покупок с корзинами и составом рецептов и
+    пересобирает расходящиеся.
+
+    Пользователи обрабатываются диапазонами первичного ключа по
+    batch_size. Возвращает количество исправленных (найденных) списков.
+    """
+    fixed = 0
+    last_pk = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            break
+        last_pk = user_ids[-1]
+        actual = _actual_lists(user_ids)
+        stored = _stored_lists(user_ids)
+        drifted = [
+            user_id for user_id in actual.keys() | stored.keys()
+            if actual.get(user_id) != stored.get(user_id)
+        ]
+        fixed += len(drifted)
+        if drifted and not dry_run:
+            with transaction.atomic():
+                ShoppingListItem.objects.filter(user__in=drifted).delete()
+                ShoppingListItem.objects.bulk_create(
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total,
+                    )
+                    for user_id in drifted
+                    for ingredient_id, total in actual[user_id].items()
+                )
+    return fixed
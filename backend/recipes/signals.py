@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Отправляется после массовых изменений (bulk_create, COPY, сырой SQL),
+# для которых Django не шлёт post_save/post_delete. sender — модель.
+bulk_changed = Signal()
@@ -30,7 +30,11 @@ def validate_username(username: str) -> str:
 
 
 def validate_recipe(data):
-    """Проверяет уникальность тегов и ингредиентов в рецепте."""
+    """
+    Проверяет наличие изображения, ингредиентов и тегов в рецепте.
+
+    Повторы и несуществующие id отсеиваются раньше, при разборе полей.
+    """
     ingredients = data.get('ingredients', [])
     tags = data.get('tags', [])
     image = data.get('image')
@@ -58,25 +62,4 @@ def validate_recipe(data):
             {'tags': 'Нужно указать хотя бы один тег.'}
         )
 
-    for ingredient in ingredients:
-        if ingredient.get('amount') < 1:
-            raise serializers.ValidationError(
-                {'ingredients': ('Колличество любого ингредиента '
-                                 'не может быть меньше 1')}
-            )
-
-    # Проверка на дубли ингредиентов
-    ingredient_ids = [item.get('id') for item in ingredients]
-    if len(ingredient_ids) != len(set(ingredient_ids)):
-        raise serializers.ValidationError(
-            {'ingredients': 'Ингредиенты не должны повторяться.'}
-        )
-
-    # Проверка на дубли тегов
-    tag_ids = [tag.id for tag in tags]
-    if len(tag_ids) != len(set(tag_ids)):
-        raise serializers.ValidationError(
-            {'tags': 'Теги не должны повторяться.'}
-        )
-
     return data
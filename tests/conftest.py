@@ -1,3 +1,9 @@
+import pytest
+
+from django.core.cache import cache
+
+from api.fragments import recipe_fragments
+
 pytest_plugins = [
     'tests.fixtures.users',
     'tests.fixtures.tag',
@@ -5,3 +11,13 @@ pytest_plugins = [
     'tests.fixtures.recipe',
     'tests.fixtures.shopping_cart',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    """Кэши не должны переживать отдельный тест."""
+    recipe_fragments.clear()
+    cache.clear()
+    yield
+    recipe_fragments.clear()
+    cache.clear()
@@ -1,6 +1,7 @@
 import pytest
 
-from recipes.models import IngredientAmount, Recipe
+from recipes.counters import change_counter
+from recipes.models import IngredientAmount, Recipe, User
 
 
 @pytest.fixture
@@ -19,6 +20,28 @@ def recipe(user, tag, ingredient):
     return recipe
 
 
+@pytest.fixture
+def recipe_factory(tag, ingredient):
+    """Фабрика рецептов: создаёт count рецептов указанного автора."""
+    def create(author, count=1):
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Описание рецепта.',
+                cooking_time=number + 1,
+                image='recipes/test.png'
+            )
+            recipe.tags.add(tag)
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number + 1)
+            recipes.append(recipe)
+        change_counter(User, author.id, 'recipes_count', count)
+        return recipes
+    return create
+
+
 @pytest.fixture
 def recipe_url(recipe):
     return f'/api/recipes/{recipe.id}/'
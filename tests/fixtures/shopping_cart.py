@@ -1,6 +1,7 @@
 import pytest
 
 from recipes.models import ShoppingCart
+from recipes.shopping_lists import change_shopping_lists
 
 
 @pytest.fixture
@@ -10,6 +11,7 @@ def shopping_cart(user, recipe):
     Возвращает объект ShoppingCart.
     """
     cart_item = ShoppingCart.objects.create(user=user, recipe=recipe)
+    change_shopping_lists([recipe.id], 1, user_id=user.id)
     return cart_item
 
 
@@ -3,6 +3,11 @@ from http import HTTPStatus
 import pytest
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.authentication import CachedTokenAuthentication
+from recipes.counters import change_counter
 
 User = get_user_model()
 
@@ -14,6 +19,7 @@ class TestAuthAndRegistration:
     USERS_URL = '/api/users/'
     TOKEN_LOGIN_URL = '/api/auth/token/login/'
     SET_PASSWORD_URL = '/api/users/set_password/'
+    TOKEN_LOGOUT_URL = '/api/auth/token/logout/'
 
     def test_registration_with_empty_data(self, no_auth_client):
         """Регистрация без данных"""
@@ -209,3 +215,67 @@ class TestAuthAndRegistration:
             'Убедитесь, что при вводе неверного пароля'
             f'возращается ответ со статусом {HTTPStatus.BAD_REQUEST}'
         )
+
+    def login(self, client, user, password='testpassword'):
+        response = client.post(self.TOKEN_LOGIN_URL, data={
+            'email': user.email, 'password': password})
+        token = response.data['auth_token']
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return token
+
+    def test_token_authentication_is_cached(
+        self, user, no_auth_client, user_me_url,
+    ):
+        self.login(no_auth_client, user)
+        no_auth_client.get(user_me_url)
+        with CaptureQueriesContext(connection) as context:
+            response = no_auth_client.get(user_me_url)
+        assert response.status_code == HTTPStatus.OK
+        assert response.data['email'] == user.email
+        assert not any(
+            'authtoken_token' in query['sql']
+            for query in context.captured_queries
+        ), 'Повторная аутентификация по токену должна обходиться без БД'
+
+        response = no_auth_client.post(self.SET_PASSWORD_URL, data={
+            'new_password': 'newpass125!!',
+            'current_password': 'testpassword',
+        })
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        user.refresh_from_db()
+        assert user.check_password('newpass125!!'), (
+            'Смена пароля у пользователя из кэша должна сохранять пароль'
+        )
+
+        response = no_auth_client.post(self.TOKEN_LOGOUT_URL)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        response = no_auth_client.get(user_me_url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'После выхода токен из кэша не должен приниматься'
+        )
+
+    def test_deactivated_user_loses_cached_token(
+        self, user, no_auth_client, user_me_url,
+    ):
+        self.login(no_auth_client, user)
+        assert no_auth_client.get(user_me_url).status_code == HTTPStatus.OK
+        user.is_active = False
+        user.save()
+        response = no_auth_client.get(user_me_url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'Деактивация пользователя должна сбрасывать кэш токена'
+        )
+
+    def test_cached_user_has_fresh_counters(self, user, no_auth_client):
+        token = self.login(no_auth_client, user)
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(token)
+        change_counter(User, user.id, 'recipes_count', 3)
+        change_counter(User, user.id, 'followers_count', 2)
+
+        with CaptureQueriesContext(connection) as context:
+            cached, _ = authentication.authenticate_credentials(token)
+        assert not context.captured_queries
+        assert (cached.recipes_count, cached.followers_count) == (3, 2), (
+            'Счётчики пользователя не должны браться из снимка в кэше'
+        )
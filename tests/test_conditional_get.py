@@ -0,0 +1,157 @@
+from http import HTTPStatus
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, Tag, User
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    TAG_LIST_URL = '/api/tags/'
+    RECIPES_LIST_URL = '/api/recipes/'
+    TOKEN_LOGIN_URL = '/api/auth/token/login/'
+
+    def test_tags_etag(
+        self, no_auth_client, tag, django_capture_on_commit_callbacks,
+    ):
+        response = no_auth_client.get(self.TAG_LIST_URL)
+        etag = response['ETag']
+        assert etag and response['Last-Modified'], (
+            'Список тегов должен отдавать ETag и Last-Modified'
+        )
+
+        response = no_auth_client.get(
+            self.TAG_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+            'Запрос с актуальным If-None-Match должен вернуть '
+            f'{HTTPStatus.NOT_MODIFIED}'
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Tag.objects.create(name='Ужин', slug='dinner')
+        response = no_auth_client.get(
+            self.TAG_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'После изменения тегов старый ETag не должен давать 304'
+        )
+        assert len(response.data) == 2
+
+    def test_recipes_etag_depends_on_user_state(
+        self, auth_client, auth_client_another, recipe, recipe_favorite_url,
+        django_capture_on_commit_callbacks,
+    ):
+        etag = auth_client.get(self.RECIPES_LIST_URL)['ETag']
+        assert auth_client_another.get(
+            self.RECIPES_LIST_URL)['ETag'] != etag, (
+            'ETag списка рецептов должен различаться для пользователей'
+        )
+        response = auth_client.get(
+            self.RECIPES_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        with django_capture_on_commit_callbacks(execute=True):
+            auth_client.post(recipe_favorite_url)
+        response = auth_client.get(
+            self.RECIPES_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Добавление в избранное должно менять ETag списка рецептов'
+        )
+        assert response.data['results'][0]['is_favorited']
+
+    def test_login_keeps_recipe_etag(
+        self, no_auth_client, user, recipe,
+        django_capture_on_commit_callbacks,
+    ):
+        etag = no_auth_client.get(self.RECIPES_LIST_URL)['ETag']
+        with django_capture_on_commit_callbacks(execute=True):
+            response = APIClient().post(self.TOKEN_LOGIN_URL, data={
+                'email': user.email, 'password': 'testpassword'})
+        assert response.status_code == HTTPStatus.OK
+        response = no_auth_client.get(
+            self.RECIPES_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+            'Вход пользователя не должен менять ETag списка рецептов'
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.first_name = 'Другое имя'
+            user.save()
+        response = no_auth_client.get(
+            self.RECIPES_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Изменение автора рецепта должно менять ETag'
+        )
+
+    def test_anonymous_recipes_response_cache(
+        self, no_auth_client, user, recipe, tag,
+        django_capture_on_commit_callbacks,
+    ):
+        params = {'tags': tag.slug, 'limit': 6}
+        first = no_auth_client.get(self.RECIPES_LIST_URL, params)
+        with CaptureQueriesContext(connection) as context:
+            second = no_auth_client.get(
+                self.RECIPES_LIST_URL, {**params, 'page': 3})
+        assert len(context) == 0, (
+            'Повторный анонимный запрос списка рецептов должен '
+            'обслуживаться из кэша без обращения к БД'
+        )
+        assert second.content == first.content
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Recipe.objects.filter(pk=recipe.pk).update(name='Другое')
+            recipe.refresh_from_db()
+            recipe.save()
+        response = no_auth_client.get(self.RECIPES_LIST_URL, params)
+        assert response.json()['results'][0]['name'] == 'Другое', (
+            'Изменение рецепта должно сбрасывать кэш ответов'
+        )
+
+    def test_recipe_delete_removes_memberships_without_select(
+        self, auth_client, user, recipe, recipe_url,
+    ):
+        Favorite.objects.bulk_create(
+            Favorite(user=User.objects.create_user(
+                username=f'fan{number}', email=f'fan{number}@example.com',
+                password='fanpass123'), recipe=recipe)
+            for number in range(5)
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.delete(recipe_url)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert not Favorite.objects.exists()
+        assert not any(
+            query['sql'].startswith('SELECT')
+            and 'recipes_favorite' in query['sql']
+            for query in context.captured_queries
+        ), (
+            'Избранное удаляемого рецепта должно удаляться одним DELETE '
+            'без выборки строк'
+        )
+
+    def test_login_keeps_anonymous_response_cache(
+        self, no_auth_client, user, recipe,
+        django_capture_on_commit_callbacks,
+    ):
+        first = no_auth_client.get(self.RECIPES_LIST_URL)
+        with django_capture_on_commit_callbacks(execute=True):
+            APIClient().post('/api/users/', data={
+                'email': 'new@example.com',
+                'username': 'newcomer',
+                'first_name': 'Новый',
+                'last_name': 'Пользователь',
+                'password': 'newpass125!!',
+                're_password': 'newpass125!!',
+            })
+            APIClient().post(self.TOKEN_LOGIN_URL, data={
+                'email': user.email, 'password': 'testpassword'})
+        with CaptureQueriesContext(connection) as context:
+            second = no_auth_client.get(self.RECIPES_LIST_URL)
+        assert len(context) == 0, (
+            'Регистрация и вход не должны сбрасывать кэш ответов '
+            'для анонимных пользователей'
+        )
+        assert second.content == first.content
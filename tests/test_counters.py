@@ -0,0 +1,94 @@
+from http import HTTPStatus
+
+import pytest
+
+from django.core.management import call_command
+
+from recipes.models import Favorite, Follow, Recipe, ShoppingCart
+
+
+@pytest.mark.django_db
+class TestCounters:
+    def test_counters_follow_write_paths(
+        self,
+        auth_client,
+        user,
+        another_user,
+        recipe,
+        recipe_favorite_url,
+        shopping_cart_url,
+        subscribe_another_user_url,
+    ):
+        auth_client.post(recipe_favorite_url)
+        auth_client.post(shopping_cart_url)
+        auth_client.post(subscribe_another_user_url)
+        recipe.refresh_from_db()
+        another_user.refresh_from_db()
+        assert recipe.favorites_count == 1, (
+            'Добавление в избранное должно увеличивать favorites_count'
+        )
+        assert recipe.in_carts_count == 1, (
+            'Добавление в список покупок должно увеличивать in_carts_count'
+        )
+        assert another_user.followers_count == 1, (
+            'Подписка должна увеличивать followers_count автора'
+        )
+
+        auth_client.delete(recipe_favorite_url)
+        auth_client.delete(shopping_cart_url)
+        auth_client.delete(subscribe_another_user_url)
+        recipe.refresh_from_db()
+        another_user.refresh_from_db()
+        assert (recipe.favorites_count, recipe.in_carts_count) == (0, 0), (
+            'Удаление из избранного и списка покупок должно уменьшать '
+            'счётчики рецепта'
+        )
+        assert another_user.followers_count == 0, (
+            'Отписка должна уменьшать followers_count автора'
+        )
+
+    def test_recipe_create_and_delete_change_recipes_count(
+        self, auth_client, user, tag, ingredient,
+    ):
+        data = {
+            'ingredients': [{'id': ingredient.id, 'amount': 2}],
+            'tags': [tag.id],
+            'image': 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAg'
+            'MAAABieywaAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4'
+            'bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg==',
+            'name': 'Омлет с сыром',
+            'text': 'Просто вкусно',
+            'cooking_time': 5,
+        }
+        response = auth_client.post('/api/recipes/', data, format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        user.refresh_from_db()
+        assert user.recipes_count == 1, (
+            'Создание рецепта должно увеличивать recipes_count автора'
+        )
+
+        auth_client.delete(f'/api/recipes/{response.data["id"]}/')
+        user.refresh_from_db()
+        assert user.recipes_count == 0, (
+            'Удаление рецепта должно уменьшать recipes_count автора'
+        )
+
+    def test_recount_counters_command(self, user, another_user, recipe):
+        Favorite.objects.create(user=another_user, recipe=recipe)
+        ShoppingCart.objects.create(user=another_user, recipe=recipe)
+        Follow.objects.create(user=another_user, author=user)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=42)
+
+        call_command('recount_counters', '--dry-run')
+        recipe.refresh_from_db()
+        assert recipe.favorites_count == 42, (
+            'Режим --dry-run не должен изменять счётчики'
+        )
+
+        call_command('recount_counters', '--batch-size', '1')
+        recipe.refresh_from_db()
+        user.refresh_from_db()
+        assert (recipe.favorites_count, recipe.in_carts_count) == (1, 1)
+        assert (user.recipes_count, user.followers_count) == (1, 1), (
+            'Команда должна пересчитать счётчики по исходным таблицам'
+        )
@@ -2,6 +2,9 @@ from http import HTTPStatus
 
 import pytest
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from recipes.models import Favorite
 
 
@@ -92,3 +95,88 @@ class TestFavorites:
             'в избранном не '
             f'должно быть записи для пользователя {another_user} и рецепта.'
         )
+
+    def test_bulk_add_and_remove_favorites(
+        self, auth_client, no_auth_client, user, another_user, recipe_factory,
+        django_assert_max_num_queries,
+    ):
+        url = '/api/recipes/favorite/'
+        recipes = recipe_factory(another_user, count=3)
+        ids = [recipe.id for recipe in recipes]
+        Favorite.objects.create(user=user, recipe=recipes[0])
+
+        response = no_auth_client.post(url, {'recipes': ids}, format='json')
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+        with django_assert_max_num_queries(8):
+            response = auth_client.post(
+                url, {'recipes': [*ids, 999999, ids[1]]}, format='json')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['results'] == [
+            {'id': ids[0], 'status': 'exists'},
+            {'id': ids[1], 'status': 'added'},
+            {'id': ids[2], 'status': 'added'},
+            {'id': 999999, 'status': 'not_found'},
+        ], 'Пакетное добавление должно сообщать результат по каждому id'
+        assert Favorite.objects.filter(user=user).count() == 3
+        recipes[1].refresh_from_db()
+        assert recipes[1].favorites_count == 1, (
+            'Пакетное добавление должно обновлять счётчики рецептов'
+        )
+
+        response = auth_client.delete(
+            url, {'recipes': [ids[0], ids[1]]}, format='json')
+        assert response.json()['results'] == [
+            {'id': ids[0], 'status': 'removed'},
+            {'id': ids[1], 'status': 'removed'},
+        ]
+        assert list(Favorite.objects.filter(user=user).values_list(
+            'recipe', flat=True)) == [ids[2]]
+        response = auth_client.delete(url, {'recipes': [ids[0], 999999]},
+                                      format='json')
+        assert response.json()['results'] == [
+            {'id': ids[0], 'status': 'not_in_list'},
+            {'id': 999999, 'status': 'not_found'},
+        ], 'Рецепт не из списка и несуществующий рецепт должны различаться'
+
+        response = auth_client.post(url, {'recipes': []}, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Пустой список рецептов должен возвращать ошибку'
+        )
+
+    def test_favorite_is_one_insert_and_one_update(
+        self, auth_client, another_user, recipe_factory,
+    ):
+        recipe, = recipe_factory(another_user)
+        url = f'/api/recipes/{recipe.id}/favorite/'
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.post(url)
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.json() == {
+            'id': recipe.id,
+            'name': recipe.name,
+            'image': f'http://testserver{recipe.image.url}',
+            'cooking_time': recipe.cooking_time,
+        }
+        statements = [
+            query['sql'] for query in context.captured_queries
+            if 'SAVEPOINT' not in query['sql']
+        ]
+        assert len(statements) == 2 and 'ON CONFLICT' in statements[0], (
+            'Добавление в избранное должно занимать два запроса: вставку '
+            'с ON CONFLICT и обновление счётчика'
+        )
+        recipe.refresh_from_db()
+        assert recipe.favorites_count == 1
+
+        response = auth_client.post(url)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        recipe.refresh_from_db()
+        assert recipe.favorites_count == 1, (
+            'Повторное добавление не должно менять счётчик'
+        )
+        for missing in ('999999', 'abc'):
+            response = auth_client.post(f'/api/recipes/{missing}/favorite/')
+            assert response.status_code == HTTPStatus.NOT_FOUND
+            response = auth_client.delete(f'/api/recipes/{missing}/favorite/')
+            assert response.status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,213 @@
+from http import HTTPStatus
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.feeds import fan_out, rebuild_timelines, sync_celebrities
+from recipes.models import TimelineEntry, User
+
+FEED_URL = '/api/recipes/feed/'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAAC'
+    'VBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAAg'
+    'gCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+def feed_ids(client, **params):
+    response = client.get(FEED_URL, params)
+    assert response.status_code == HTTPStatus.OK
+    return [recipe['id'] for recipe in response.data['results']]
+
+
+@pytest.mark.django_db
+class TestFeed:
+    def test_feed_follows_subscriptions(
+        self, auth_client, auth_client_another, no_auth_client, user,
+        another_user, recipe_factory, tag, ingredient,
+        subscribe_another_user_url,
+    ):
+        assert no_auth_client.get(FEED_URL).status_code == (
+            HTTPStatus.UNAUTHORIZED)
+        old = recipe_factory(another_user, count=2)
+        assert feed_ids(auth_client) == []
+
+        auth_client.post(subscribe_another_user_url)
+        assert feed_ids(auth_client) == [old[1].id, old[0].id], (
+            'После подписки в ленте должны появиться рецепты автора'
+        )
+
+        response = auth_client_another.post('/api/recipes/', {
+            'ingredients': [{'id': ingredient.id, 'amount': 2}],
+            'tags': [tag.id],
+            'image': IMAGE,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+        }, format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        new_id = response.data['id']
+        assert TimelineEntry.objects.filter(
+            user=user, recipe_id=new_id).exists(), (
+            'Новый рецепт должен попадать в ленты подписчиков при публикации'
+        )
+        assert feed_ids(auth_client)[0] == new_id
+
+        auth_client.delete(subscribe_another_user_url)
+        assert feed_ids(auth_client) == [], (
+            'После отписки рецепты автора должны пропадать из ленты'
+        )
+
+    def test_feed_cursor_pagination_and_trim(
+        self, auth_client, user, another_user, recipe_factory, settings,
+        subscribe_another_user_url,
+    ):
+        settings.FEED_TIMELINE_LENGTH = 3
+        recipes = recipe_factory(another_user, count=5)
+        auth_client.post(subscribe_another_user_url)
+
+        response = auth_client.get(FEED_URL, {'limit': 2})
+        assert [recipe['id'] for recipe in response.data['results']] == [
+            recipes[4].id, recipes[3].id]
+        assert response.data['next'], 'Лента должна отдавать курсор'
+        response = auth_client.get(response.data['next'])
+        assert [recipe['id'] for recipe in response.data['results']] == [
+            recipes[2].id]
+        assert response.data['next'] is None
+        response = auth_client.get(response.data['previous'])
+        assert [recipe['id'] for recipe in response.data['results']] == [
+            recipes[4].id, recipes[3].id], (
+            'Ссылка previous должна вести на предыдущую страницу ленты'
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            feed_ids(auth_client)
+        assert not any(
+            query['sql'].startswith('DELETE')
+            for query in context.captured_queries
+        ), 'Чтение ленты не должно ничего удалять'
+
+        newest = recipe_factory(another_user)[0]
+        another_user.refresh_from_db()
+        fan_out(newest)
+        assert list(
+            TimelineEntry.objects.filter(user=user)
+            .order_by('-pub_date', '-recipe')
+            .values_list('recipe', flat=True)
+        ) == [newest.id, recipes[4].id, recipes[3].id], (
+            'Лента должна обрезаться до FEED_TIMELINE_LENGTH записей '
+            'при публикации рецепта'
+        )
+
+    def test_celebrity_recipes_are_read_at_fan_in(
+        self, auth_client, user, another_user, recipe_factory, settings,
+        subscribe_another_user_url,
+    ):
+        settings.FEED_FANOUT_LIMIT = 0
+        auth_client.post(subscribe_another_user_url)
+        assert sync_celebrities() == 1
+        recipes = recipe_factory(another_user, count=2)
+        for recipe in recipes:
+            fan_out(recipe)
+        assert not TimelineEntry.objects.exists(), (
+            'Рецепты популярных авторов не должны копироваться в ленты'
+        )
+        assert feed_ids(auth_client) == [recipes[1].id, recipes[0].id], (
+            'Рецепты популярных авторов должны подмешиваться при чтении'
+        )
+
+    def test_feed_merges_timeline_and_celebrities_by_cursor(
+        self, auth_client, user, another_user, recipe_factory, settings,
+        subscribe_another_user_url,
+    ):
+        star = User.objects.create_user(
+            username='star', email='star@example.com', password='starpass1')
+        auth_client.post(subscribe_another_user_url)
+        auth_client.post(f'/api/users/{star.id}/subscribe/')
+        User.objects.filter(pk=star.pk).update(is_celebrity=True)
+        recipes = []
+        for _ in range(3):
+            recipes += recipe_factory(another_user) + recipe_factory(star)
+        for recipe in recipes:
+            recipe.author.refresh_from_db()
+            fan_out(recipe)
+
+        ids, url = [], FEED_URL + '?limit=2'
+        while url:
+            response = auth_client.get(url)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        assert ids == [recipe.id for recipe in reversed(recipes)], (
+            'Лента должна сливать записи ленты и рецепты популярных '
+            'авторов в порядке публикации без пропусков и повторов'
+        )
+
+    def test_author_crossing_fanout_limit(
+        self, auth_client, user, another_user, recipe_factory, settings,
+        subscribe_another_user_url,
+    ):
+        settings.FEED_FANOUT_LIMIT = 1
+        recipes = recipe_factory(another_user, count=2)
+        expected = [recipes[1].id, recipes[0].id]
+        auth_client.post(subscribe_another_user_url)
+        assert TimelineEntry.objects.filter(user=user).count() == 2
+
+        fan = APIClient()
+        fan.force_authenticate(User.objects.create_user(
+            username='fan', email='fan@example.com', password='fanpass123'))
+        with CaptureQueriesContext(connection) as context:
+            fan.post(subscribe_another_user_url)
+        assert not any(
+            query['sql'].startswith('DELETE')
+            for query in context.captured_queries
+        ), 'Подписка не должна переводить автора через порог в запросе'
+        assert feed_ids(auth_client) == expected
+
+        assert sync_celebrities(batch_size=1) == 1
+        another_user.refresh_from_db()
+        assert another_user.is_celebrity
+        assert not TimelineEntry.objects.exists(), (
+            'Рецепты автора, ставшего популярным, должны убираться из лент'
+        )
+        assert feed_ids(auth_client) == expected
+        assert sync_celebrities() == 0, 'Повторный запуск ничего не меняет'
+
+        fan.delete(subscribe_another_user_url)
+        assert feed_ids(auth_client) == expected
+        newest = recipe_factory(another_user)[0]
+        fan_out(newest)
+        assert sync_celebrities(batch_size=1) == 1
+        assert list(
+            TimelineEntry.objects.filter(user=user)
+            .order_by('-pub_date', '-recipe')
+            .values_list('recipe', flat=True)
+        ) == [newest.id, *expected], (
+            'Рецепты автора, переставшего быть популярным, должны '
+            'возвращаться в ленты подписчиков'
+        )
+        assert feed_ids(auth_client) == [newest.id, *expected]
+
+    def test_feed_has_no_duplicates_while_author_is_switched(
+        self, auth_client, another_user, recipe_factory,
+        subscribe_another_user_url,
+    ):
+        recipes = recipe_factory(another_user, count=2)
+        auth_client.post(subscribe_another_user_url)
+        User.objects.filter(pk=another_user.pk).update(is_celebrity=True)
+        assert feed_ids(auth_client) == [recipes[1].id, recipes[0].id], (
+            'Копии в ленте и подмешанные рецепты не должны повторяться'
+        )
+
+    def test_rebuild_timelines(
+        self, auth_client, another_user, recipe_factory,
+        subscribe_another_user_url,
+    ):
+        recipe_factory(another_user, count=3)
+        auth_client.post(subscribe_another_user_url)
+        expected = feed_ids(auth_client)
+        TimelineEntry.objects.all().delete()
+        assert rebuild_timelines() == 3
+        assert feed_ids(auth_client) == expected
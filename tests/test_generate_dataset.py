@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import pytest
+
+from django.core.management import call_command
+from django.db.models import F, Max, Min
+
+from recipes.counters import recount_counters
+from recipes.models import Favorite, Follow, IngredientAmount, Recipe, User
+
+
+def dataset_shape():
+    return (
+        list(Recipe.objects.order_by('id').values_list(
+            'author__username', 'cooking_time')),
+        sorted(Favorite.objects.values_list(
+            'user__username', 'recipe__name')),
+        sorted(Follow.objects.values_list(
+            'user__username', 'author__username')),
+    )
+
+
+@pytest.mark.django_db
+class TestGenerateDataset:
+    OPTIONS = ('--users', '20', '--recipes', '50', '--ingredients', '30',
+               '--seed', '7')
+
+    def test_dataset_is_consistent_and_deterministic(self):
+        call_command('generate_dataset', *self.OPTIONS)
+        assert User.objects.count() == 20
+        assert Recipe.objects.count() == 50
+        assert IngredientAmount.objects.exists()
+        assert not Follow.objects.filter(
+            user=F('author')).exists(), (
+            'Пользователь не должен подписываться сам на себя'
+        )
+        assert not any(recount_counters(dry_run=True).values()), (
+            'После генерации счётчики должны совпадать с данными'
+        )
+        dates = Recipe.objects.aggregate(
+            first=Min('pub_date'), last=Max('pub_date'))
+        assert dates['last'] - dates['first'] > timedelta(days=30), (
+            'Даты публикации должны быть разбросаны по --days дням'
+        )
+        assert Recipe.objects.values('pub_date').distinct().count() == 50
+        shape = dataset_shape()
+
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+        call_command('generate_dataset', *self.OPTIONS)
+        assert dataset_shape() == shape, (
+            'Одинаковое зерно должно давать одинаковый набор данных'
+        )
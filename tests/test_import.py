@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from django.core.management import call_command
+
+from recipes.models import Ingredient, Tag
+
+
+@pytest.mark.django_db
+class TestImportCommands:
+    def test_import_ingredients_from_csv_and_json(
+        self, tmp_path, no_auth_client, django_capture_on_commit_callbacks,
+    ):
+        csv_file = tmp_path / 'ingredients.csv'
+        csv_file.write_text(
+            'абрикосы,г\nбаклажаны,шт.\n,г\nабрикосы,г\n', encoding='utf-8')
+        json_file = tmp_path / 'ingredients.json'
+        json_file.write_text(json.dumps([
+            {'name': 'абрикосы', 'measurement_unit': 'г'},
+            {'name': 'ванилин', 'measurement_unit': 'г'},
+        ]), encoding='utf-8')
+
+        call_command('import_ingredients', str(csv_file), '--dry-run')
+        assert not Ingredient.objects.exists(), (
+            'Режим --dry-run не должен ничего записывать в БД'
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command('import_ingredients', str(csv_file),
+                         '--batch-size', '1')
+            call_command('import_ingredients', str(json_file))
+        assert sorted(Ingredient.objects.values_list('name', flat=True)) == [
+            'абрикосы', 'баклажаны', 'ванилин'], (
+            'Импорт должен пропускать пустые строки и уже существующие '
+            'ингредиенты'
+        )
+        response = no_auth_client.get('/api/ingredients/', {'name': 'ван'})
+        assert [item['name'] for item in response.json()] == ['ванилин'], (
+            'После импорта поиск ингредиентов должен видеть новые записи'
+        )
+
+    def test_import_tags_lowercases_slug(self, tmp_path):
+        csv_file = tmp_path / 'tags.csv'
+        csv_file.write_text('name,slug\nЗавтрак,Breakfast\n',
+                            encoding='utf-8')
+        call_command('import_tags', str(csv_file))
+        assert list(Tag.objects.values_list('slug', flat=True)) == [
+            'breakfast'], 'Slug тега должен сохраняться в нижнем регистре'
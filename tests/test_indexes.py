@@ -0,0 +1,174 @@
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.search import IngredientSearch
+from recipes.feeds import fan_out
+from recipes.models import Favorite, ShoppingCart
+
+
+def explain(sql, params=()):
+    """Возвращает план запроса текущей СУБД одной строкой."""
+    prefix = (
+        'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # На маленьких тестовых таблицах seq scan всегда дешевле.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(prefix + sql, params)
+        return ' '.join(str(column) for row in cursor.fetchall()
+                        for column in row)
+
+
+def captured_plan(client, url, table, method='get', data=None,
+                  statement='SELECT'):
+    """
+    План первого запроса statement к таблице table, выполненного
+    эндпоинтом.
+    """
+    with CaptureQueriesContext(connection) as context:
+        if method == 'get':
+            response = client.get(url)
+        else:
+            response = getattr(client, method)(url, data, format='json')
+        if response.streaming:
+            # Запросы потокового ответа выполняются при его чтении.
+            b''.join(response.streaming_content)
+    assert response.status_code == HTTPStatus.OK
+    marker = f'FROM "{table}"' if statement == 'SELECT' else f'"{table}"'
+    for query in context.captured_queries:
+        sql = query['sql']
+        if sql.startswith(statement) and marker in sql:
+            return explain(sql)
+    raise AssertionError(f'Эндпоинт {url} не обращался к таблице {table}')
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    def test_recipe_list_uses_pub_date_index(
+        self, no_auth_client, user, recipe_factory,
+    ):
+        recipe_factory(user, count=3)
+        plan = captured_plan(
+            no_auth_client, '/api/recipes/?cursor=', 'recipes_recipe')
+        assert 'recipe_pub_date_id_idx' in plan, (
+            'Лента рецептов должна читаться по индексу (-pub_date, -id)'
+        )
+
+    def test_author_recipes_use_author_pub_date_index(
+        self, no_auth_client, user, recipe_factory,
+    ):
+        recipe_factory(user, count=3)
+        plan = captured_plan(
+            no_auth_client,
+            f'/api/recipes/?author={user.id}&cursor=',
+            'recipes_recipe',
+        )
+        assert 'recipe_author_pub_date_idx' in plan, (
+            'Рецепты автора должны читаться по индексу (author, -pub_date)'
+        )
+
+    def test_feed_reads_timeline_index(
+        self, auth_client, another_user, recipe_factory,
+        subscribe_another_user_url,
+    ):
+        recipe_factory(another_user, count=3)
+        auth_client.post(subscribe_another_user_url)
+        plan = captured_plan(
+            auth_client, '/api/recipes/feed/', 'recipes_timelineentry')
+        assert 'timeline_user_pub_date_idx' in plan, (
+            'Лента должна читаться по индексу (user, -pub_date, -recipe)'
+        )
+
+    def test_fan_out_trims_timelines_by_index(
+        self, auth_client, another_user, recipe_factory,
+        subscribe_another_user_url,
+    ):
+        auth_client.post(subscribe_another_user_url)
+        recipe = recipe_factory(another_user)[0]
+        another_user.refresh_from_db()
+        with CaptureQueriesContext(connection) as context:
+            fan_out(recipe)
+        sql, = (query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('DELETE'))
+        plan = explain(sql)
+        assert 'timeline_user_pub_date_idx' in plan, (
+            'Граница ленты должна искаться по индексу '
+            '(user, -pub_date, -recipe)'
+        )
+        assert 'TEMP B-TREE' not in plan and 'Sort' not in plan, (
+            'Обрезка лент не должна сортировать записи лент'
+        )
+
+    @pytest.mark.parametrize('params, model', (
+        ({'is_favorited': 1}, Favorite),
+        ({'is_in_shopping_cart': 1}, ShoppingCart),
+    ))
+    def test_membership_filters_use_user_recipe_index(
+        self, auth_client, user, recipe, params, model,
+    ):
+        model.objects.create(user=user, recipe=recipe)
+        table = model._meta.db_table
+        plan = captured_plan(
+            auth_client,
+            f'/api/recipes/?{urlencode({**params, "cursor": ""})}',
+            'recipes_recipe',
+        )
+        assert (
+            f'sqlite_autoindex_{table}' in plan
+            or model._meta.constraints[0].name in plan
+        ), (
+            f'Фильтр {params} должен читать {model.__name__} по '
+            f'уникальному индексу (user, recipe)'
+        )
+
+    def test_recipe_update_reads_carts_by_recipe_index(
+        self, auth_client, user, recipe, recipe_url, tag, ingredient,
+    ):
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        plan = captured_plan(
+            auth_client, recipe_url, 'recipes_shoppingcart',
+            method='patch',
+            data={
+                'ingredients': [{'id': ingredient.id, 'amount': 7}],
+                'tags': [tag.id],
+                'name': 'Новое название',
+                'text': 'Новый текст',
+                'cooking_time': 3,
+            },
+            statement='INSERT',
+        )
+        assert 'shopping_cart_recipe_user_idx' in plan, (
+            'Пересчёт списков покупок при изменении рецепта должен искать '
+            'корзины по индексу (recipe, user)'
+        )
+
+    def test_download_shopping_cart_reads_user_list_index(
+        self, auth_client, shopping_cart, download_shopping_cart_url,
+    ):
+        plan = captured_plan(
+            auth_client,
+            download_shopping_cart_url,
+            'recipes_shoppinglistitem',
+        )
+        assert 'unique_shopping_list_item' in plan or (
+            'sqlite_autoindex_recipes_shoppinglistitem' in plan
+        ), 'Список покупок должен читаться по индексу (user, ingredient)'
+
+    @pytest.mark.skipif(
+        connection.vendor != 'postgresql',
+        reason='Нечёткий поиск через pg_trgm есть только в PostgreSQL',
+    )
+    def test_fuzzy_ingredient_search_uses_trigram_index(self, ingredient):
+        queryset = IngredientSearch.pg_trgm_search(
+            'малако', exclude=[], limit=10)
+        plan = explain(*queryset.query.sql_with_params())
+        assert 'ingredient_name_upper_trgm_idx' in plan, (
+            'Нечёткий поиск ингредиентов должен использовать GIN-индекс '
+            'pg_trgm'
+        )
@@ -1,3 +1,6 @@
+import gzip
+import json
+
 from http import HTTPStatus
 
 import pytest
@@ -151,3 +154,126 @@ class TestIngredients:
             'PATCH запрос авторизованного пользователя на изменение '
             'ингредиента не должен менять изгредиент в БД'
         )
+
+    def test_search_ranks_prefix_before_substring(
+        self, no_auth_client, django_assert_num_queries,
+    ):
+        for name in ('Молоко', 'Топлёное молоко', 'молотый перец', 'Мёд'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+        response = no_auth_client.get(self.INGREDIENTS_LIST_URL, {
+            'name': 'МОЛ'})
+        names = [item['name'] for item in response.json()]
+        assert names == ['Молоко', 'молотый перец', 'Топлёное молоко'], (
+            'Поиск должен быть регистронезависимым, а совпадения по началу '
+            'названия должны идти раньше совпадений в середине'
+        )
+
+        response = no_auth_client.get(self.INGREDIENTS_LIST_URL, {
+            'name': 'мед'})
+        assert [item['name'] for item in response.json()] == ['Мёд'], (
+            'Поиск не должен различать «ё» и «е»'
+        )
+
+        with django_assert_num_queries(0):
+            response = no_auth_client.get(self.INGREDIENTS_LIST_URL, {
+                'name': 'мол', 'limit': 1})
+        assert [item['name'] for item in response.json()] == ['Молоко'], (
+            'Автодополнение должно учитывать limit и не обращаться к БД'
+        )
+
+    def test_search_index_follows_catalog_changes(
+        self, no_auth_client, ingredient,
+        django_capture_on_commit_callbacks,
+    ):
+        response = no_auth_client.get(self.INGREDIENTS_SEARCH_URL)
+        assert len(response.json()) == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Ingredient.objects.create(name='Яйцо перепелиное',
+                                      measurement_unit='шт.')
+        response = no_auth_client.get(self.INGREDIENTS_SEARCH_URL)
+        assert len(response.json()) == 2, (
+            'Индекс поиска должен перестраиваться после изменения каталога'
+        )
+
+    def test_fuzzy_search_tolerates_typos(self, no_auth_client):
+        for name in ('Молоко', 'Молоко 3,2%', 'Помидоры черри', 'Мёд'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+        response = no_auth_client.get(self.INGREDIENTS_LIST_URL, {
+            'name': 'малоко'})
+        assert response.json() == [], (
+            'Без нечёткого режима опечатка не должна находить ингредиенты'
+        )
+
+        response = no_auth_client.get(self.INGREDIENTS_LIST_URL, {
+            'name': 'малоко', 'fuzzy': '1'})
+        assert [item['name'] for item in response.json()] == [
+            'Молоко', 'Молоко 3,2%'], (
+            'Нечёткий режим должен находить названия с опечаткой, '
+            'короткие названия — выше'
+        )
+
+        response = no_auth_client.get(self.INGREDIENTS_LIST_URL, {
+            'name': 'памидоры чери', 'fuzzy': 'true'})
+        assert [item['name'] for item in response.json()] == [
+            'Помидоры черри'], (
+            'Нечёткий режим должен находить фразы с опечатками в каждом слове'
+        )
+
+    @pytest.mark.parametrize('accept_encoding, gzipped', (
+        ('gzip', True),
+        ('deflate, GZIP;q=0.5', True),
+        ('*', True),
+        ('gzip;q=0', False),
+        ('identity, gzip;q=0', False),
+        ('*;q=0', False),
+        ('gzip;q=0, *', False),
+        ('br', False),
+    ))
+    def test_snapshot_honours_accept_encoding(
+        self, no_auth_client, ingredient, accept_encoding, gzipped,
+    ):
+        response = no_auth_client.get(
+            f'{self.INGREDIENTS_LIST_URL}snapshot/',
+            HTTP_ACCEPT_ENCODING=accept_encoding,
+        )
+        assert (response.get('Content-Encoding') == 'gzip') == gzipped, (
+            f'Accept-Encoding: {accept_encoding} должен '
+            f'{"разрешать" if gzipped else "запрещать"} сжатый ответ'
+        )
+        if not gzipped:
+            assert response.json()[0]['name'] == ingredient.name
+
+    def test_snapshot_is_precompressed_and_versioned(
+        self, no_auth_client, ingredient,
+        django_capture_on_commit_callbacks, django_assert_num_queries,
+    ):
+        url = f'{self.INGREDIENTS_LIST_URL}snapshot/'
+        response = no_auth_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(response.content)) == (
+            no_auth_client.get(self.INGREDIENTS_LIST_URL).json()
+        ), 'Снимок должен совпадать со списком ингредиентов'
+        etag = response['ETag']
+        version = response['X-Snapshot-Version']
+
+        with django_assert_num_queries(0):
+            response = no_auth_client.get(url, {'version': version})
+        assert json.loads(response.content)[0]['name'] == ingredient.name
+        assert 'immutable' in response['Cache-Control'], (
+            'Версионированный снимок должен кэшироваться без ограничений'
+        )
+        response = no_auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        response = no_auth_client.get(url, {'version': version})
+        assert response.status_code == HTTPStatus.FOUND, (
+            'Устаревшая версия снимка должна перенаправлять на актуальную'
+        )
+        response = no_auth_client.get(response['Location'])
+        assert response['ETag'] != etag
+        assert len(json.loads(response.content)) == 2
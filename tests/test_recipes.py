@@ -1,8 +1,22 @@
+import re
+
 from http import HTTPStatus
 
 import pytest
 
-from recipes.models import Recipe
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers import FieldPlanMixin
+from recipes.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
 
 
 @pytest.mark.django_db
@@ -191,3 +205,315 @@ class TestRecipes:
             'Запрос автора рецепта на изменение рецепта '
             'должен изменить рецепт в БД'
         )
+
+    def test_recipes_list_query_count_does_not_depend_on_page_size(
+        self, auth_client, user, another_user, recipe_factory,
+    ):
+        def count_queries():
+            # Связи пользователя каждый раз читаются из БД, а не из кэша.
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = auth_client.get(
+                    self.RECIPES_LIST_URL, {'limit': 100})
+            assert response.status_code == HTTPStatus.OK
+            return len(context)
+
+        Follow.objects.create(user=user, author=another_user)
+        recipes = recipe_factory(another_user, count=2)
+        Favorite.objects.create(user=user, recipe=recipes[0])
+        queries_for_small_page = count_queries()
+
+        recipe_factory(another_user, count=8)
+        recipe_factory(user, count=5)
+        assert count_queries() == queries_for_small_page, (
+            'Количество запросов к БД при выводе списка рецептов '
+            'не должно зависеть от количества рецептов на странице'
+        )
+
+        response = auth_client.get(self.RECIPES_LIST_URL, {'limit': 100})
+        favorited = {
+            item['id'] for item in response.data['results']
+            if item['is_favorited']
+        }
+        assert favorited == {recipes[0].id}, (
+            'Флаг is_favorited должен быть установлен только для рецептов '
+            'из избранного пользователя'
+        )
+        assert all(
+            item['author']['is_subscribed']
+            == (item['author']['id'] == another_user.id)
+            for item in response.data['results']
+        ), 'Флаг is_subscribed должен учитывать подписки пользователя'
+
+    def test_membership_flags_come_from_cache(
+        self, auth_client, user, another_user, recipe_factory,
+        django_capture_on_commit_callbacks,
+    ):
+        recipes = recipe_factory(another_user, count=3)
+        Follow.objects.create(user=user, author=another_user)
+        auth_client.get(self.RECIPES_LIST_URL)
+
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.get(self.RECIPES_LIST_URL)
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        assert not re.search(
+            'recipes_(favorite|shoppingcart|follow)', sql), (
+            'Флаги пользователя должны браться из кэша его связей '
+            'без запросов к БД'
+        )
+        assert all(
+            item['author']['is_subscribed']
+            for item in response.data['results']
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            auth_client.post(f'/api/recipes/{recipes[0].id}/favorite/')
+        response = auth_client.get(
+            self.RECIPES_LIST_URL, {'is_favorited': 1})
+        assert [item['id'] for item in response.data['results']] == [
+            recipes[0].id]
+        assert response.data['results'][0]['is_favorited'], (
+            'Запись в избранное должна менять версию кэша связей'
+        )
+
+    @pytest.mark.parametrize('param, model', (
+        ('is_favorited', Favorite),
+        ('is_in_shopping_cart', ShoppingCart),
+    ))
+    def test_membership_filters(
+        self, auth_client, no_auth_client, user, recipe_factory,
+        param, model,
+    ):
+        chosen, other = recipe_factory(user, count=2)
+        model.objects.create(user=user, recipe=chosen)
+
+        response = auth_client.get(self.RECIPES_LIST_URL, {param: 1})
+        assert response.status_code == HTTPStatus.OK
+        assert [item['id'] for item in response.data['results']] == [
+            chosen.id], f'Фильтр {param}=1 должен оставить только свои рецепты'
+
+        response = auth_client.get(self.RECIPES_LIST_URL, {param: 0})
+        assert [item['id'] for item in response.data['results']] == [
+            other.id], f'Фильтр {param}=0 должен исключить свои рецепты'
+
+        response = no_auth_client.get(self.RECIPES_LIST_URL, {param: 1})
+        assert response.json()['results'] == [], (
+            f'Для анонима фильтр {param}=1 должен возвращать пустой список'
+        )
+
+    def test_recipes_keyset_pagination(
+        self, no_auth_client, user, recipe_factory,
+    ):
+        recipe_factory(user, count=7)
+        expected_ids = list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+        ids, pages = [], []
+        url = f'{self.RECIPES_LIST_URL}?cursor=&limit=3'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = no_auth_client.get(url)
+            assert response.status_code == HTTPStatus.OK
+            data = response.json()
+            assert 'count' not in data
+            assert not any(
+                'COUNT(' in query['sql'] for query in context.captured_queries
+            ), 'В keyset-режиме не должен выполняться COUNT(*)'
+            pages.append(data)
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        assert ids == expected_ids, (
+            'Обход по курсорам должен вернуть все рецепты '
+            'в порядке (-pub_date, -id) без повторов'
+        )
+
+        response = no_auth_client.get(pages[-1]['previous'])
+        assert [item['id'] for item in response.json()['results']] == [
+            item['id'] for item in pages[-2]['results']
+        ], 'Ссылка previous должна вести на предыдущую страницу'
+
+        response = no_auth_client.get(
+            self.RECIPES_LIST_URL, {'cursor': 'broken'})
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_recipe_fragment_cache(
+        self, auth_client, auth_client_another, user, another_user,
+        recipe, recipe_url, tag, ingredient,
+    ):
+        Favorite.objects.create(user=another_user, recipe=recipe)
+        Follow.objects.create(user=another_user, author=user)
+
+        with CaptureQueriesContext(connection) as cold:
+            auth_client.get(self.RECIPES_LIST_URL)
+        with CaptureQueriesContext(connection) as warm:
+            response = auth_client.get(self.RECIPES_LIST_URL)
+        assert len(warm) < len(cold), (
+            'Повторный запрос списка должен брать общую часть рецепта '
+            'из кэша без загрузки связанных объектов'
+        )
+        item = response.data['results'][0]
+        assert not item['is_favorited']
+        assert not item['author']['is_subscribed']
+
+        response = auth_client_another.get(self.RECIPES_LIST_URL)
+        item = response.data['results'][0]
+        assert item['is_favorited'] and item['author']['is_subscribed'], (
+            'Флаги пользователя должны подставляться поверх кэша '
+            'для каждого пользователя отдельно'
+        )
+        assert item['ingredients'][0]['name'] == ingredient.name
+
+        auth_client.patch(recipe_url, {
+            'ingredients': [{'id': ingredient.id, 'amount': 7}],
+            'tags': [tag.id],
+            'name': 'Новое название',
+            'text': 'Новый текст',
+            'cooking_time': 3,
+        }, format='json')
+        response = auth_client.get(recipe_url)
+        assert response.data['name'] == 'Новое название', (
+            'Изменение рецепта должно сбрасывать кэш фрагмента'
+        )
+        assert response.data['ingredients'][0]['amount'] == 7
+
+    def test_fragment_cache_follows_related_names(
+        self, auth_client, user, recipe, recipe_url, tag, ingredient,
+        django_capture_on_commit_callbacks,
+    ):
+        auth_client.get(recipe_url)
+        with django_capture_on_commit_callbacks(execute=True):
+            tag.name = 'Новый тег'
+            tag.save()
+            ingredient.name = 'Новый ингредиент'
+            ingredient.save()
+            user.first_name = 'Новое имя'
+            user.save(update_fields=['first_name'])
+
+        data = auth_client.get(recipe_url).data
+        assert data['tags'][0]['name'] == 'Новый тег', (
+            'Переименование тега должно сбрасывать кэш фрагмента'
+        )
+        assert data['ingredients'][0]['name'] == 'Новый ингредиент', (
+            'Переименование ингредиента должно сбрасывать кэш фрагмента'
+        )
+        assert data['author']['first_name'] == 'Новое имя', (
+            'Изменение имени автора должно сбрасывать кэш фрагмента'
+        )
+
+    def test_filter_by_several_tags_without_duplicates(
+        self, no_auth_client, user, tag, recipe_factory,
+    ):
+        lunch = Tag.objects.create(name='Обед', slug='lunch')
+        both, only_first = recipe_factory(user, count=2)
+        both.tags.add(lunch)
+        untagged = recipe_factory(user)[0]
+        untagged.tags.clear()
+
+        response = no_auth_client.get(
+            self.RECIPES_LIST_URL, {'tags': [tag.slug, lunch.slug]})
+        data = response.json()
+        ids = [item['id'] for item in data['results']]
+        assert sorted(ids) == sorted([both.id, only_first.id]), (
+            'Фильтр по нескольким тегам должен вернуть каждый подходящий '
+            'рецепт ровно один раз'
+        )
+        assert data['count'] == 2
+
+        response = no_auth_client.get(
+            self.RECIPES_LIST_URL, {'tags': 'unknown'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_sparse_fieldsets_and_compact_view(
+        self, auth_client, user, recipe_factory,
+    ):
+        recipe_factory(user, count=3)
+
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.get(
+                self.RECIPES_LIST_URL, {'view': 'compact'})
+        item = response.data['results'][0]
+        assert set(item) == {'id', 'name', 'image', 'cooking_time'}, (
+            'Компактный режим должен отдавать только id, name, image и '
+            'cooking_time'
+        )
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        assert '"text"' not in sql, (
+            'Неиспользуемое поле text должно исключаться из запроса'
+        )
+        assert 'recipes_ingredientamount' not in sql, (
+            'Ингредиенты не должны загружаться, если они не запрошены'
+        )
+
+        response = auth_client.get(
+            self.RECIPES_LIST_URL, {'fields': 'name,is_favorited,tags'})
+        item = response.data['results'][0]
+        assert set(item) == {'id', 'name', 'is_favorited', 'tags'}
+
+        response = auth_client.get(
+            self.RECIPES_LIST_URL, {'omit': 'text,ingredients'})
+        item = response.data['results'][0]
+        assert 'text' not in item and 'ingredients' not in item
+        assert 'author' in item and 'is_in_shopping_cart' in item
+
+    def test_field_plan_matches_drf_representation(
+        self, auth_client, user, another_user, recipe_factory, monkeypatch,
+    ):
+        recipe_factory(another_user, count=3)
+        Follow.objects.create(user=user, author=another_user)
+
+        fast = auth_client.get(self.RECIPES_LIST_URL, {'cursor': ''})
+        monkeypatch.setattr(FieldPlanMixin, 'use_field_plan', False)
+        monkeypatch.setattr(
+            'api.serializers.get_fragment', lambda *args: None)
+        default = auth_client.get(self.RECIPES_LIST_URL, {'cursor': ''})
+        assert fast.content == default.content, (
+            'Быстрый путь сериализации должен давать тот же JSON, '
+            'что и стандартный DRF'
+        )
+
+    def test_create_resolves_references_in_bulk(
+        self, auth_client, tag,
+    ):
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(40)
+        )
+        data = {
+            'ingredients': [
+                {'id': item.id, 'amount': 1} for item in ingredients],
+            'tags': [tag.id],
+            'image': 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAg'
+            'MAAABieywaAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4'
+            'bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg==',
+            'name': 'Салат из сорока ингредиентов',
+            'text': 'Смешать всё.',
+            'cooking_time': 5,
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.post(
+                self.RECIPES_LIST_URL, data=data, format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        single_lookups = [
+            query['sql'] for query in context.captured_queries
+            if re.search(r'"recipes_(ingredient|tag)"\."id" = \d',
+                         query['sql'])
+        ]
+        assert not single_lookups, (
+            'Ингредиенты и теги должны загружаться одним запросом на список, '
+            'а не запросом на каждый id'
+        )
+
+        data['ingredients'] += [{'id': 99998, 'amount': 1},
+                                {'id': 99999, 'amount': 1}]
+        data['tags'] = [tag.id, tag.id]
+        response = auth_client.post(
+            self.RECIPES_LIST_URL, data=data, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert '99998, 99999' in str(response.data['ingredients']), (
+            'Ошибка должна перечислять все несуществующие ингредиенты сразу'
+        )
+        assert str(tag.id) in str(response.data['tags']), (
+            'Ошибка должна называть повторяющиеся теги'
+        )
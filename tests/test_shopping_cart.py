@@ -1,8 +1,18 @@
+import json
+import time
+
+from concurrent.futures.process import BrokenProcessPool
 from http import HTTPStatus
 
 import pytest
 
-from recipes.models import ShoppingCart
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import pdf_exports
+from api.exporters import ShoppingListPDFRenderer
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.shopping_lists import reconcile_shopping_lists
 
 
 @pytest.mark.django_db
@@ -90,3 +100,230 @@ class TestShoppingCart:
     ):
         response = auth_client.get(download_shopping_cart_url)
         assert response.status_code == HTTPStatus.OK
+
+    def test_download_shopping_cart_requires_auth(
+        self, no_auth_client, download_shopping_cart_url,
+    ):
+        response = no_auth_client.get(download_shopping_cart_url)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'Анонимный запрос списка покупок должен возвращать '
+            f'{HTTPStatus.UNAUTHORIZED}'
+        )
+
+    def test_download_shopping_cart_formats(
+        self, auth_client, user, ingredient, recipe_factory,
+        download_shopping_cart_url,
+    ):
+        for recipe in recipe_factory(user, count=3):
+            auth_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        total = f'{ingredient.name} — 6 {ingredient.measurement_unit}'
+
+        response = auth_client.get(download_shopping_cart_url)
+        assert response.streaming, 'Выгрузка должна отдаваться потоком'
+        assert response['Content-Type'].startswith('text/plain'), (
+            'По умолчанию список покупок выгружается текстом'
+        )
+        content = b''.join(response.streaming_content).decode()
+        assert content.splitlines() == [
+            'Список покупок:', '=' * 20, f'• {total}',
+        ], 'Количества одинаковых ингредиентов должны суммироваться'
+
+        response = auth_client.get(
+            download_shopping_cart_url, {'format': 'csv'})
+        assert 'shopping_list.csv' in response['Content-Disposition']
+        content = b''.join(response.streaming_content).decode()
+        assert content.splitlines() == [
+            'Ингредиент,Количество,Единица измерения',
+            f'{ingredient.name},6,{ingredient.measurement_unit}',
+        ]
+
+        response = auth_client.get(
+            download_shopping_cart_url, {'format': 'json'})
+        assert json.loads(b''.join(response.streaming_content)) == [{
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+            'amount': 6,
+        }]
+
+        response = auth_client.get(
+            download_shopping_cart_url, {'format': 'xml'})
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Неизвестный формат выгрузки должен возвращать 404'
+        )
+
+    @pytest.mark.skipif(not ShoppingListPDFRenderer.is_available(),
+                        reason='reportlab не установлен')
+    def test_download_shopping_cart_pdf(
+        self, auth_client, shopping_cart, download_shopping_cart_url,
+        settings, tmp_path,
+    ):
+        settings.SHOPPING_LIST_PDF_WORKERS = 0
+        settings.SHOPPING_LIST_EXPORT_DIR = str(tmp_path)
+        response = auth_client.get(
+            download_shopping_cart_url, {'format': 'pdf'}, follow=True)
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'] == 'application/pdf'
+        content = b''.join(response.streaming_content)
+        assert content.startswith(b'%PDF') and content.rstrip().endswith(
+            b'%%EOF'), 'Выгрузка в PDF должна быть целым документом'
+
+    @pytest.mark.skipif(not ShoppingListPDFRenderer.is_available(),
+                        reason='reportlab не установлен')
+    @pytest.mark.parametrize('workers', (0, 1))
+    def test_pdf_failure_returns_503_and_retries(
+        self, auth_client, shopping_cart, settings, tmp_path, monkeypatch,
+        workers,
+    ):
+        settings.SHOPPING_LIST_PDF_WORKERS = workers
+        settings.SHOPPING_LIST_EXPORT_DIR = str(tmp_path)
+        url = '/api/recipes/download_shopping_cart/pdf/'
+
+        class BrokenExecutor:
+            def submit(self, *args):
+                raise BrokenProcessPool('Процесс пула завершился аварийно')
+
+            def shutdown(self, wait=True):
+                pass
+
+        def broken_render(items, path):
+            raise OSError('Нет места на диске')
+
+        if workers:
+            monkeypatch.setattr(
+                pdf_exports.shopping_list_pdf, '_executor', BrokenExecutor())
+        else:
+            monkeypatch.setattr(pdf_exports, 'render_pdf', broken_render)
+        response = auth_client.get(url)
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE, (
+            'Сбой отрисовки или пула должен возвращать 503, а не 500'
+        )
+        assert response.json()['status'] == pdf_exports.FAILED
+        assert 'error' in response.json()
+        assert response['Retry-After']
+
+        monkeypatch.undo()
+        settings.SHOPPING_LIST_PDF_WORKERS = 0
+        response = auth_client.get(url)
+        assert response.status_code == HTTPStatus.OK, (
+            'После сбоя следующий запрос должен запускать отрисовку заново'
+        )
+        response.close()
+
+    @pytest.mark.skipif(not ShoppingListPDFRenderer.is_available(),
+                        reason='reportlab не установлен')
+    def test_pdf_is_rendered_in_background_and_cached(
+        self, auth_client, user, shopping_cart, ingredient, settings,
+        tmp_path, recipe_factory, django_capture_on_commit_callbacks,
+    ):
+        settings.SHOPPING_LIST_PDF_WORKERS = 1
+        settings.SHOPPING_LIST_EXPORT_DIR = str(tmp_path)
+        url = '/api/recipes/download_shopping_cart/pdf/'
+
+        response = auth_client.get(url)
+        assert response.status_code == HTTPStatus.ACCEPTED, (
+            'Первый запрос должен ставить отрисовку PDF в очередь'
+        )
+        version = response.json()['version']
+        deadline = time.monotonic() + 30
+        while response.status_code == HTTPStatus.ACCEPTED:
+            assert time.monotonic() < deadline, 'PDF не был готов за 30 с'
+            time.sleep(0.05)
+            response = auth_client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert response['X-Shopping-List-Version'] == version
+        assert b''.join(response.streaming_content).startswith(b'%PDF')
+
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.get(url)
+        assert response.status_code == HTTPStatus.OK, (
+            'Неизменный список покупок должен отдаваться из готового файла'
+        )
+        response.close()
+        assert not any(
+            'recipes_shoppinglistitem' in query['sql']
+            for query in context.captured_queries
+        ), 'Версия неизменного списка должна браться из кэша'
+
+        other = recipe_factory(user)[0]
+        with django_capture_on_commit_callbacks(execute=True):
+            auth_client.post(f'/api/recipes/{other.id}/shopping_cart/')
+        response = auth_client.get(url)
+        assert response.status_code == HTTPStatus.ACCEPTED
+        assert response.json()['version'] != version, (
+            'Изменение списка покупок должно менять его версию'
+        )
+
+    def test_download_empty_shopping_cart(
+        self, auth_client, download_shopping_cart_url,
+    ):
+        response = auth_client.get(
+            download_shopping_cart_url, {'format': 'json'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.json() == {'error': 'Список покупок пуст.'}
+
+    def test_shopping_list_follows_carts_and_recipes(
+        self, auth_client, auth_client_another, user, another_user,
+        ingredient, tag, recipe_factory,
+    ):
+        first, second = recipe_factory(another_user, count=2)
+
+        def shopping_list():
+            return dict(
+                ShoppingListItem.objects.filter(user=user)
+                .values_list('ingredient', 'total_amount'))
+
+        auth_client.post(f'/api/recipes/{first.id}/shopping_cart/')
+        auth_client.post(f'/api/recipes/{second.id}/shopping_cart/')
+        assert shopping_list() == {ingredient.id: 3}, (
+            'Добавление в корзину должно прибавлять ингредиенты рецепта '
+            'к сводному списку'
+        )
+
+        auth_client_another.patch(f'/api/recipes/{second.id}/', {
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+            'tags': [tag.id],
+            'name': second.name,
+            'text': second.text,
+            'cooking_time': second.cooking_time,
+        }, format='json')
+        assert shopping_list() == {ingredient.id: 11}, (
+            'Изменение состава рецепта должно обновлять списки покупок '
+            'тех, у кого он в корзине'
+        )
+
+        auth_client.delete(f'/api/recipes/{first.id}/shopping_cart/')
+        assert shopping_list() == {ingredient.id: 10}
+        auth_client_another.delete(f'/api/recipes/{second.id}/')
+        assert shopping_list() == {}, (
+            'Удаление рецепта должно убирать его из сводного списка'
+        )
+        assert reconcile_shopping_lists(dry_run=True) == 0
+
+    def test_reconcile_shopping_lists(self, user, shopping_cart, ingredient):
+        ShoppingListItem.objects.filter(user=user).update(total_amount=100)
+        assert reconcile_shopping_lists(dry_run=True) == 1
+        assert ShoppingListItem.objects.get(user=user).total_amount == 100, (
+            'Сверка с --dry-run не должна ничего менять'
+        )
+        assert reconcile_shopping_lists() == 1
+        assert ShoppingListItem.objects.get(user=user).total_amount == 2, (
+            'Сверка должна пересобирать расходящийся список покупок'
+        )
+        assert reconcile_shopping_lists() == 0
+
+    def test_bulk_shopping_cart_updates_shopping_list(
+        self, auth_client, user, another_user, ingredient, recipe_factory,
+    ):
+        url = '/api/recipes/shopping_cart/'
+        ids = [recipe.id for recipe in recipe_factory(another_user, count=3)]
+
+        response = auth_client.post(url, {'recipes': ids}, format='json')
+        assert [item['status'] for item in response.json()['results']] == [
+            'added'] * 3
+        assert ShoppingListItem.objects.get(user=user).total_amount == 6, (
+            'Пакетное добавление в корзину должно обновлять сводный список'
+        )
+
+        auth_client.delete(url, {'recipes': ids[1:]}, format='json')
+        assert ShoppingListItem.objects.get(user=user).total_amount == 1
+        assert reconcile_shopping_lists(dry_run=True) == 0
@@ -2,11 +2,20 @@ from http import HTTPStatus
 
 import pytest
 
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from recipes.models import Follow
 
+User = get_user_model()
+
 
 @pytest.mark.django_db
 class TestSubscribes:
+    SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+
     def test_add_delete_subscribe_user(
         self,
         auth_client,
@@ -98,3 +107,93 @@ class TestSubscribes:
             'После удаления подписки друг на друга запись должна '
             'появиться в БД.'
         )
+
+    def test_subscriptions_query_count_does_not_depend_on_page_size(
+        self, auth_client, user, recipe_factory,
+    ):
+        def follow_authors(start, count):
+            for number in range(start, start + count):
+                author = User.objects.create_user(
+                    username=f'author{number}',
+                    email=f'author{number}@example.com',
+                    first_name='Author',
+                    last_name='Test',
+                    password='authorpass123',
+                )
+                recipe_factory(author, count=3)
+                Follow.objects.create(user=user, author=author)
+
+        def count_queries():
+            # Связи пользователя каждый раз читаются из БД, а не из кэша.
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = auth_client.get(
+                    self.SUBSCRIPTIONS_URL,
+                    {'limit': 100, 'recipes_limit': 2},
+                )
+            assert response.status_code == HTTPStatus.OK
+            return len(context), response.data['results']
+
+        follow_authors(0, 2)
+        queries_for_small_page, _ = count_queries()
+
+        follow_authors(2, 6)
+        queries, results = count_queries()
+        assert queries == queries_for_small_page, (
+            'Количество запросов к БД при выводе подписок '
+            'не должно зависеть от количества авторов на странице'
+        )
+        assert len(results) == 8
+        assert all(
+            len(author['recipes']) == 2 and author['recipes_count'] == 3
+            for author in results
+        ), 'recipes_limit и recipes_count должны учитываться для каждого автора'
+
+    def test_subscriptions_recipes_limit(
+        self, auth_client, user, another_user, recipe_factory, settings,
+        subscribe_another_user_url,
+    ):
+        settings.SUBSCRIPTION_RECIPES_LIMIT = 3
+        recipes = recipe_factory(another_user, count=5)
+        Follow.objects.create(user=user, author=another_user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client.get(
+                self.SUBSCRIPTIONS_URL, {'recipes_limit': 2})
+        author, = response.data['results']
+        assert [recipe['id'] for recipe in author['recipes']] == [
+            recipes[4].id, recipes[3].id,
+        ], 'В подписках должны выводиться последние рецепты автора'
+        assert author['recipes_count'] == 5
+        assert any(
+            'ROW_NUMBER()' in query['sql']
+            for query in context.captured_queries
+        ), 'Рецепты авторов должны ограничиваться оконной функцией'
+
+        response = auth_client.get(
+            self.SUBSCRIPTIONS_URL, {'recipes_limit': 100})
+        assert len(response.data['results'][0]['recipes']) == 3, (
+            'recipes_limit не должен превышать SUBSCRIPTION_RECIPES_LIMIT'
+        )
+        response = auth_client.get(
+            self.SUBSCRIPTIONS_URL, {'recipes_limit': 0})
+        assert response.data['results'][0]['recipes'] == []
+
+        for limit in ('abc', '-1'):
+            response = auth_client.get(
+                self.SUBSCRIPTIONS_URL, {'recipes_limit': limit})
+            assert response.status_code == HTTPStatus.BAD_REQUEST, (
+                'Некорректный recipes_limit должен возвращать 400, а не 500'
+            )
+
+        Follow.objects.all().delete()
+        response = auth_client.post(
+            f'{subscribe_another_user_url}?recipes_limit=abc')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert not Follow.objects.exists(), (
+            'Подписка не должна создаваться при некорректном recipes_limit'
+        )
+        response = auth_client.post(
+            f'{subscribe_another_user_url}?recipes_limit=1')
+        assert response.status_code == HTTPStatus.CREATED
+        assert len(response.data['recipes']) == 1